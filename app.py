@@ -6,6 +6,7 @@ from modules.auth.auth_ui import AuthUI
 from modules.auth.auth_service import AuthService
 from modules.feedback.feedback_service import FeedbackService
 from modules.feedback.feedback_ui import FeedbackUI
+from modules.history.history_service import HistoryService
 from ui.langgraph_ui import LangGraphUI
 from ui.conventional_ui import ConventionalUI
 from modules.link.link_ui import LinkUI
@@ -13,6 +14,8 @@ from modules.file.file_ui import FileUI
 from modules.link.link_service import LinkService
 from modules.file.file_service import FileService
 from config.config import APP_TITLE, APP_ICON, APP_LAYOUT
+from utils.migrations import migrate
+from graph.checkpointing import start_checkpoint_cleanup
 import os
 import streamlit as st
 
@@ -42,23 +45,39 @@ def setup_environment_variables():
             "⚠️ TAVILY_API_KEY not set in environment. Web search functionality will be limited.")
 
 
+@st.cache_resource
+def get_services() -> tuple[AuthService, FileService, LinkService, FeedbackService, HistoryService]:
+    """
+    Set up the database and create the services, once per process.
+
+    The services hold no per-session state, so every session shares them.
+    """
+    migrate()
+
+    auth_service = AuthService()
+    feedback_service = FeedbackService()
+    auth_service.seed_predefined_users()
+    feedback_service.seed_predefined_questions()
+    auth_service.start_session_cleanup()
+    start_checkpoint_cleanup()
+
+    return auth_service, FileService(), LinkService(), feedback_service, HistoryService()
+
+
 def main():
     """Main application function."""
     setup_page_config()
 
     # Initialize services
-    auth_service = AuthService()
-    file_service = FileService()
-    link_service = LinkService()
-    feedback_service = FeedbackService()
+    auth_service, file_service, link_service, feedback_service, history_service = get_services()
 
     # Initialize UI components
     auth_ui = AuthUI(auth_service)
     file_ui = FileUI(file_service)
     link_ui = LinkUI(link_service)
     feedback_ui = FeedbackUI(feedback_service, auth_service)
-    conventional_ui = ConventionalUI(file_service, link_service)
-    langgraph_ui = LangGraphUI(file_service, link_service)
+    conventional_ui = ConventionalUI(file_service, link_service, history_service)
+    langgraph_ui = LangGraphUI(file_service, link_service, history_service)
 
     # Check if user is authenticated
     if not auth_ui.is_authenticated():
@@ -90,7 +109,7 @@ def main():
 
 6. **Manage Sources** - Use the "Source Management" tab to view or delete your uploaded content if needed.
 
-7. **Download History** - Export your conversation history using the download button in each AI tab.
+7. **Download History** - Your questions are kept across sessions. Export them with the download button in each AI tab.
 
 8. **Provide Feedback** - Share your experience in the "Feedback" section, which is mandatory after using the application.""")
 
@@ -113,39 +132,7 @@ def main():
                 submit_button = st.form_submit_button("Upload Selected Files")
 
                 if submit_button and uploaded_files:
-                    for uploaded_file in uploaded_files:
-                        # Get existing files to check for duplicates
-                        existing_files = file_service.get_user_files(
-                            current_user.user_id)
-                        duplicate = any(
-                            f.name == uploaded_file.name for f in existing_files)
-
-                        # Handle duplicates based on user preference
-                        if duplicate and not replace_existing:
-                            st.warning(
-                                f"File '{uploaded_file.name}' already exists. Select 'Replace existing files' option to overwrite.")
-                            continue
-                        elif duplicate and replace_existing:
-                            # Delete existing file with the same name
-                            for existing_file in existing_files:
-                                if existing_file.name == uploaded_file.name:
-                                    file_service.delete_file(existing_file.id)
-                                    st.info(
-                                        f"Replacing existing file: {uploaded_file.name}")
-                                    break
-
-                        # Add file to service
-                        file_model = file_service.add_file(
-                            file=uploaded_file.getbuffer(),
-                            filename=uploaded_file.name,
-                            file_type=uploaded_file.type,
-                            user_id=current_user.user_id
-                        )
-
-                        if file_model:
-                            st.success(f"Uploaded: {uploaded_file.name}")
-                        else:
-                            st.error(f"Failed to upload: {uploaded_file.name}")
+                    file_ui.upload_files(uploaded_files, current_user, replace_existing)
         else:
             st.warning("Please log in to upload files")
 
@@ -8,6 +8,10 @@ from pathlib import Path
 BASE_DIR = Path(__file__).parent.parent
 
 UPLOAD_DIR = os.path.join(BASE_DIR, "data", "uploaded_files")
+# Max number of files of a bulk upload sent to the object store at the same time
+FILE_UPLOAD_MAX_WORKERS = 4
+# Files read per transaction when listing all of them, each batch is synced with the object store after
+FILE_LIST_BATCH_SIZE = 200
 
 # Application settings
 APP_TITLE = "AMA"
@@ -16,5 +20,118 @@ APP_LAYOUT = "wide"
 
 # AUTH Config
 SESSION_DURATION_IN_DAYS = 1
+# How long a validated session is trusted without asking the database, also bounds how long
+# a logout in another process of the deployment takes to be noticed
+SESSION_CACHE_TTL_SECONDS = 60
+SESSION_CACHE_MAX_SIZE = 10_000
+SESSION_CLEANUP_INTERVAL_SECONDS = 60 * 60
+
+# How long the feedback question list is reused, it is refreshed whenever a question is added or deleted
+FEEDBACK_QUESTIONS_CACHE_TTL_SECONDS = 5 * 60
+
+# Where the app data lives: "postgres" for the database configured in st.secrets.db, or "sqlite"
+# for an embedded database file, for single-node deployments that should not depend on network services
+STORAGE_BACKEND = os.environ.get("AMA_STORAGE_BACKEND", "postgres")
+SQLITE_PATH = os.environ.get("AMA_SQLITE_PATH", os.path.join(BASE_DIR, "data", "ama.sqlite"))
+# Max wait for the SQLite write lock held by another connection
+SQLITE_BUSY_TIMEOUT_SECONDS = 10
+# Time zone of the app hosts that wrote the timestamps before migration 2, they were stored
+# without one and are read in this zone when the columns become TIMESTAMPTZ
+LEGACY_TIMESTAMP_TIME_ZONE = os.environ.get("AMA_LEGACY_TIMESTAMP_TIME_ZONE", "UTC")
+
+# Where uploaded files are kept: "supabase" for the bucket configured in st.secrets.bucket, or "local"
+OBJECT_STORE = os.environ.get("AMA_OBJECT_STORE", "supabase")
+# Root of the local object store, the upload dir itself by default so that files are not stored twice
+LOCAL_OBJECT_STORE_DIR = os.environ.get("AMA_LOCAL_OBJECT_STORE_DIR", UPLOAD_DIR)
+
+# Questions shown per page of the query history, the latest page is also kept in the session
+HISTORY_PAGE_SIZE = 5
+
+# Postgres connection pool shared by every session
+DB_POOL_MIN_SIZE = 1
+DB_POOL_MAX_SIZE = 10
+# Max wait for a free connection before giving up
+DB_POOL_ACQUIRE_TIMEOUT_SECONDS = 10
+# Connections idle for longer are checked with a SELECT 1 before being handed out
+DB_POOL_HEALTH_CHECK_IDLE_SECONDS = 60
 
 CHROMA_PATH = os.path.join(BASE_DIR, ".chroma")
+
+# Base URL of the local OpenAI/Tavily stand-in (python -m tools.stub_server), unset to use the real APIs
+STUB_SERVER_URL = os.environ.get("AMA_STUB_SERVER_URL")
+OPENAI_BASE_URL = f"{STUB_SERVER_URL}/v1" if STUB_SERVER_URL else os.environ.get("OPENAI_BASE_URL")
+TAVILY_BASE_URL = STUB_SERVER_URL
+
+# OpenAI rate limits per model as (requests per minute, tokens per minute), match them to the account tier
+LLM_RATE_LIMITS = {
+    "o4-mini": (500, 200_000),
+    "gpt-4o": (500, 30_000),
+    "gpt-4o-mini": (500, 200_000),
+    "gpt-3.5-turbo": (3_500, 200_000),
+}
+LLM_DEFAULT_RATE_LIMIT = (500, 30_000)
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_BASE_SECONDS = 1.0
+LLM_BACKOFF_MAX_SECONDS = 30.0
+# Send a second request when a call is slower than the model's p95 latency
+LLM_HEDGING_ENABLED = False
+
+# Model, reasoning effort and token cap of each LLM step by query complexity (see utils/model_routing.py).
+# The complex route is the one used for every question when routing is disabled.
+# Reasoning models (o-series) need a reasoning_effort, which also drops the temperature of the conventional path
+MODEL_ROUTING_ENABLED = True
+MODEL_ROUTES = {
+    "augmentation": {
+        "simple": {"model": "gpt-3.5-turbo", "reasoning_effort": None, "max_tokens": 300},
+        "standard": {"model": "gpt-3.5-turbo", "reasoning_effort": None, "max_tokens": 300},
+        "complex": {"model": "gpt-3.5-turbo", "reasoning_effort": None, "max_tokens": 300},
+    },
+    "generation": {
+        "simple": {"model": "gpt-4o-mini", "reasoning_effort": None, "max_tokens": 3000},
+        "standard": {"model": "o4-mini", "reasoning_effort": "low", "max_tokens": 6000},
+        "complex": {"model": "o4-mini", "reasoning_effort": None, "max_tokens": 10000},
+    },
+    "reflection": {
+        "simple": {"model": "gpt-3.5-turbo", "reasoning_effort": None, "max_tokens": 500},
+        "standard": {"model": "gpt-3.5-turbo", "reasoning_effort": None, "max_tokens": 1000},
+        "complex": {"model": "gpt-3.5-turbo", "reasoning_effort": None, "max_tokens": 1500},
+    },
+    "conventional": {
+        "simple": {"model": "gpt-4o-mini", "reasoning_effort": None, "max_tokens": 2000},
+        "standard": {"model": "gpt-4o", "reasoning_effort": None, "max_tokens": 4000},
+        "complex": {"model": "gpt-4o", "reasoning_effort": None, "max_tokens": 10000},
+    },
+}
+# Margin of the best reranked chunk over the next ones (cross-encoder logits) above which the
+# answer is taken to be in one chunk, and below which it has to be put together from several
+ROUTING_SCORE_SPREAD_HIGH = 4.0
+ROUTING_SCORE_SPREAD_LOW = 1.0
+
+# JSONL file the per-run traces are appended to
+TRACE_PATH = os.path.join(BASE_DIR, "data", "traces.jsonl")
+
+# SQLite file the agent runs are checkpointed to after each node
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "data", "checkpoints.sqlite")
+# Checkpoints of runs that were not resumed for this long are deleted, checked every interval
+CHECKPOINT_TTL_SECONDS = 24 * 60 * 60
+CHECKPOINT_CLEANUP_INTERVAL_SECONDS = 60 * 60
+
+# Agent settings
+# Accept answers that contain every required section without asking the reflection LLM
+REFLECTION_PRECHECK_ACCEPT_COMPLETE = False
+# Stop the reflection loop after this many reflections
+REFLECTION_MAX_ROUNDS = 4
+# Stop the reflection loop once consecutive generations are at least this similar (0..1)
+REFLECTION_CONVERGENCE_RATIO = 0.95
+# Wall-clock budget for a whole agent run, another round is skipped if it would overrun it
+AGENT_RUN_TIME_BUDGET_SECONDS = 180
+# How long and how many retrieved chunks are kept in memory, the graph state only carries their ids
+CHUNK_STORE_TTL_SECONDS = 30 * 60
+CHUNK_STORE_MAX_SIZE = 5000
+# Max number of concurrent web searches, one search is run per spare part
+WEB_SEARCH_MAX_WORKERS = 4
+# How long web search results for a part number are reused
+WEB_SEARCH_CACHE_TTL_SECONDS = 6 * 60 * 60
+# Run spare parts extraction and web search for each draft while it is being reflected on.
+# Saves a round-trip when the draft is accepted, at the cost of searches for rejected drafts
+SPECULATIVE_SPARE_PARTS = False
@@ -0,0 +1,221 @@
+"""
+Deterministic parsing of the sectioned answers produced by the generation chain.
+"""
+import re
+
+THOUGHT_PROCESS_SECTION = "Thought Process"
+FINAL_ANSWER_SECTION = "Final Answer"
+BRAND_NAME_SECTION = "Brand name"
+PART_NUMBERS_SECTION = "Part Numbers"
+
+ANSWER_SECTIONS = [
+    THOUGHT_PROCESS_SECTION,
+    FINAL_ANSWER_SECTION,
+    BRAND_NAME_SECTION,
+    PART_NUMBERS_SECTION,
+]
+
+# Matches a section header, tolerating markdown decoration such as "**Final Answer:**" or
+# "### Part Numbers". The name is either alone on its line or followed by a colon and the
+# content, so prose that merely mentions a section, e.g. "Part numbers are listed in table 3.",
+# is not taken for a header
+_SECTION_HEADER_PATTERN = re.compile(
+    r"^[ \t>#*_-]*(" + "|".join(re.escape(s) for s in ANSWER_SECTIONS) + r")"
+    r"(?:[ \t*_]*:[ \t*_]*(.*)|[ \t*_]*)$",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+# Placeholders that mean the model left a section unfilled
+_EMPTY_SECTION_PATTERN = re.compile(r"^[\s\-\*\[\]\.:]*$")
+
+
+def parse_sections(answer: str) -> dict[str, str]:
+    """
+    Split an answer into its sections.
+
+    Args:
+        answer: The generated answer
+
+    Returns:
+        dict[str, str]: Section name mapped to its stripped content, for every section found
+    """
+    canonical = {s.lower(): s for s in ANSWER_SECTIONS}
+    matches = list(_SECTION_HEADER_PATTERN.finditer(answer))
+
+    sections = {}
+    for i, match in enumerate(matches):
+        name = canonical[match.group(1).lower()]
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(answer)
+        content = ((match.group(2) or "") + answer[match.end():end]).strip()
+
+        # Keep the first occurrence, later ones are usually quotes of the header
+        if name not in sections:
+            sections[name] = content
+
+    return sections
+
+
+def missing_sections(answer: str) -> list[str]:
+    """
+    List the sections that are absent or empty in an answer.
+
+    Args:
+        answer: The generated answer
+
+    Returns:
+        list[str]: Names of the missing sections, in the expected order
+    """
+    sections = parse_sections(answer)
+    return [
+        s for s in ANSWER_SECTIONS
+        if s not in sections or _EMPTY_SECTION_PATTERN.match(sections[s])
+    ]
+
+
+# Phrases stating that a listed part has no part number
+_NO_PART_NUMBER_PATTERN = re.compile(
+    r"does not have|doesn't have|do not have|no part number|not available|not mentioned"
+    r"|not specified|not provided|not listed|not found|\bn/?a\b|\bnone\b",
+    re.IGNORECASE,
+)
+
+# An explicitly labelled part number, e.g. "Part Number: 6205-2RS" or "P/N 123-456"
+_LABELLED_PART_NUMBER_PATTERN = re.compile(
+    r"(?:part\s*(?:number|no\.?|#)|p/n|\bpn)\s*[:#]?\s*([A-Za-z0-9][A-Za-z0-9./-]*[A-Za-z0-9])",
+    re.IGNORECASE,
+)
+
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9./-]*[A-Za-z0-9]")
+_BULLET_PATTERN = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_NAME_SEPARATORS = " \t-–—:*_,;"
+# Brackets left empty once the part number inside them is removed from the name
+_EMPTY_BRACKETS_PATTERN = re.compile(r"[(\[][\s,;/-]*[)\]]")
+
+# Oil grades and measures such as "10W-40", "M8x1.25", "250mm" or "12V"
+_VISCOSITY_PATTERN = re.compile(r"(?:SAE)?\d{1,2}W-?\d{1,3}", re.IGNORECASE)
+_MEASURE_PATTERN = re.compile(
+    r"(?:M\d+(?:[.,]\d+)?(?:x\d+(?:[.,]\d+)?)?"
+    r"|\d+(?:[.,]\d+)?(?:x\d+(?:[.,]\d+)?)*"
+    r"(?:mm|cm|m|in|kg|g|lbs?|nm|bar|psi|kpa|mpa|l|ml|v|a|w|kw|hp|rpm|hz|°c|c|f))",
+    re.IGNORECASE,
+)
+
+# Max length of the price question, the search API truncates longer queries
+MAX_PRICE_QUESTION_LENGTH = 350
+
+
+def _is_part_number(token: str) -> bool:
+    """Check if a token looks like a part number rather than a word, count or measure."""
+    digits = sum(c.isdigit() for c in token)
+    if len(token) < 4 or digits < 2:
+        return False
+
+    # Plain decimals such as "0.25" are measures, not part numbers
+    if re.fullmatch(r"\d+\.\d+", token):
+        return False
+
+    return not (_VISCOSITY_PATTERN.fullmatch(token) or _MEASURE_PATTERN.fullmatch(token))
+
+
+def _clean_name(name: str) -> str:
+    """Strip the delimiters left around a part name once its number is removed."""
+    name = _EMPTY_BRACKETS_PATTERN.sub("", name).strip(_NAME_SEPARATORS)
+
+    # A bracket opened before the number, e.g. "Oil filter (P/N 123-456)"
+    while name.endswith(("(", "[")):
+        name = name[:-1].rstrip(_NAME_SEPARATORS)
+
+    return " ".join(name.split())
+
+
+def extract_part_numbers(answer: str) -> list[dict[str, str]] | None:
+    """
+    Extract the part names and numbers listed in the Part Numbers section of an answer.
+
+    Args:
+        answer: The generated answer
+
+    Returns:
+        list[dict[str, str]] | None: Parts as {'name', 'number'} dicts, an empty list if
+        the answer has no part numbers, or None if the section can't be parsed reliably
+    """
+    section = parse_sections(answer).get(PART_NUMBERS_SECTION)
+    if section is None:
+        return None
+
+    parts = []
+    seen_numbers = set()
+    for line in section.splitlines():
+        line = _BULLET_PATTERN.sub("", line).strip()
+
+        # Skip blank lines and introductions such as "The following parts are needed:"
+        if not line or line.endswith(":"):
+            continue
+
+        labelled = _LABELLED_PART_NUMBER_PATTERN.search(line)
+        if labelled:
+            name = line[:labelled.start()]
+            numbers = [labelled.group(1)]
+        else:
+            name, _, rest = line.partition(":")
+            numbers = [t for t in _TOKEN_PATTERN.findall(rest or line) if _is_part_number(t)]
+            if not rest:
+                for number in numbers:
+                    name = name.replace(number, "")
+
+        if not numbers:
+            if _NO_PART_NUMBER_PATTERN.search(line):
+                continue
+
+            # A line we can't classify, let the LLM read the answer
+            return None
+
+        name = _clean_name(name)
+        for number in numbers:
+            if number.upper() not in seen_numbers:
+                seen_numbers.add(number.upper())
+                parts.append({"name": name, "number": number})
+
+    return parts
+
+
+def extract_brand_name(answer: str) -> str:
+    """
+    Get the first line of the Brand name section of an answer.
+
+    Args:
+        answer: The generated answer
+
+    Returns:
+        str: The brand name, or an empty string if it isn't mentioned
+    """
+    section = parse_sections(answer).get(BRAND_NAME_SECTION, "")
+    brand = _clean_name(_BULLET_PATTERN.sub("", section.strip().split("\n")[0]))
+
+    if _NO_PART_NUMBER_PATTERN.search(brand):
+        return ""
+
+    return brand[:80]
+
+
+def build_price_question(parts: list[dict[str, str]], brand: str = "") -> str:
+    """
+    Build a price search question for a list of parts.
+
+    Args:
+        parts: Parts as {'name', 'number'} dicts
+        brand: Brand and model of the equipment
+
+    Returns:
+        str: The question, at most MAX_PRICE_QUESTION_LENGTH characters long
+    """
+    question = f"What is the price of the following {brand} spare parts:" if brand \
+        else "What is the price of the following spare parts:"
+
+    for i, part in enumerate(parts):
+        item = f" {part['name']} part number {part['number']}".replace("  ", " ")
+        if len(question) + len(item) + 2 > MAX_PRICE_QUESTION_LENGTH:
+            break
+        question += ("," if i else "") + item
+
+    return (question + "?")[:MAX_PRICE_QUESTION_LENGTH]
@@ -1,13 +1,8 @@
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from langchain_core.runnables import Runnable
 
-llm = ChatOpenAI(
-    model="o4-mini",
-    # temperature=0.2,  # Add some creativity while keeping responses focused
-    max_completion_tokens=10000   # Adjust based on your needs
-)
+from utils.model_routing import ModelRoute, get_chat_model
 
 generation_prompt = ChatPromptTemplate.from_messages(
     [
@@ -47,4 +42,6 @@ generation_prompt = ChatPromptTemplate.from_messages(
     ]
     )
 
-generation_chain = generation_prompt | llm | StrOutputParser()
+def get_generation_chain(model_route: ModelRoute) -> Runnable:
+    """Get the generation chain using the model of a route"""
+    return generation_prompt | get_chat_model(model_route)
@@ -1,5 +1,7 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
+from langchain_core.runnables import Runnable
+
+from utils.model_routing import ModelRoute, get_chat_model
 
 REFLECTION_END_ANSWER = 'useful answer'.lower()
 
@@ -18,5 +20,6 @@ reflection_prompt = ChatPromptTemplate.from_messages(
     )
 
 
-llm = ChatOpenAI()
-reflection_chain = reflection_prompt | llm
+def get_reflection_chain(model_route: ModelRoute) -> Runnable:
+    """Get the reflection chain using the model of a route"""
+    return reflection_prompt | get_chat_model(model_route)
@@ -1,6 +1,8 @@
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 
+from config.config import OPENAI_BASE_URL
+
 SPARE_PARTS_EXTRACTION_END_ANSWER = 'No part numbers available'.lower()
 
 spare_parts_extraction_prompt = ChatPromptTemplate.from_messages(
@@ -19,5 +21,5 @@ spare_parts_extraction_prompt = ChatPromptTemplate.from_messages(
 )
 
 
-llm = ChatOpenAI()
+llm = ChatOpenAI(base_url=OPENAI_BASE_URL, max_retries=0)
 spare_parts_extraction_chain = spare_parts_extraction_prompt | llm
@@ -0,0 +1,184 @@
+"""
+SQLite checkpoints of agent runs, so that an interrupted or failed run resumes from its last completed node.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import streamlit as st
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from config.config import CHECKPOINT_CLEANUP_INTERVAL_SECONDS, CHECKPOINT_PATH, CHECKPOINT_TTL_SECONDS
+
+# Threads with a run in progress in this process
+_live_threads: set[str] = set()
+_live_threads_lock = threading.Lock()
+
+
+class RunInProgressError(Exception):
+    """Raised when a run is started on a thread whose previous run has not returned yet."""
+
+
+@st.cache_resource
+def get_checkpointer() -> SqliteSaver:
+    """Get the checkpointer shared by every session, SqliteSaver serializes access to the connection"""
+    os.makedirs(os.path.dirname(CHECKPOINT_PATH), exist_ok=True)
+    connection = sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False)
+    checkpointer = SqliteSaver(connection)
+    checkpointer.setup()
+    return checkpointer
+
+
+class CheckpointThreads:
+    """When each checkpoint thread was last run, in the checkpoint database, to prune the abandoned ones."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        """
+        Initialize the registry.
+
+        Args:
+            connection: Connection to the checkpoint database
+        """
+        self.connection = connection
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoint_threads (thread_id TEXT PRIMARY KEY, last_run_at REAL NOT NULL)")
+
+    def touch(self, thread_id: str) -> None:
+        """Record that a run of the thread starts now."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO checkpoint_threads (thread_id, last_run_at) VALUES (?, ?) "
+                "ON CONFLICT (thread_id) DO UPDATE SET last_run_at = excluded.last_run_at",
+                (thread_id, time.time()))
+
+    def forget(self, thread_id: str) -> None:
+        """Drop a thread whose checkpoints were deleted."""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM checkpoint_threads WHERE thread_id = ?", (thread_id,))
+
+    def expired(self, max_age_seconds: float) -> list[str]:
+        """
+        Get the threads not run for longer than max_age_seconds.
+
+        Threads checkpointed before they were recorded here count from now.
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO checkpoint_threads (thread_id, last_run_at) "
+                "SELECT DISTINCT thread_id, ? FROM checkpoints", (now,))
+            rows = self.connection.execute(
+                "SELECT thread_id FROM checkpoint_threads WHERE last_run_at < ?", (now - max_age_seconds,))
+            return [thread_id for thread_id, in rows]
+
+
+@st.cache_resource
+def get_checkpoint_threads() -> CheckpointThreads:
+    """Get the registry of checkpoint threads, once the checkpoint tables exist"""
+    get_checkpointer()
+    return CheckpointThreads(sqlite3.connect(CHECKPOINT_PATH, check_same_thread=False))
+
+
+def checkpoint_thread_id(session_id: str, question: str, retriever_id: str) -> str:
+    """
+    Build the checkpoint thread of a question, so that asking it again in the same session
+    resumes the run instead of starting over.
+
+    Args:
+        session_id: ID of the user's session
+        question: The user's question
+        retriever_id: ID of the index the question is asked about
+
+    Returns:
+        str: The thread ID
+    """
+    key = hashlib.sha256(f"{retriever_id}\n{question.strip()}".encode()).hexdigest()[:16]
+    return f"{session_id}:{key}"
+
+
+@contextmanager
+def claim_thread(thread_id: str) -> Iterator[None]:
+    """
+    Hold a thread for the duration of a run.
+
+    A cancelled run keeps going in its worker until its next node, so the question can be
+    asked again before its checkpoints stop changing. Only one run of a thread at a time.
+
+    Args:
+        thread_id: The thread ID
+
+    Raises:
+        RunInProgressError: If a run of the thread has not returned yet
+    """
+    with _live_threads_lock:
+        if thread_id in _live_threads:
+            raise RunInProgressError("The previous run of this question is still stopping, try again in a moment.")
+        _live_threads.add(thread_id)
+    try:
+        try:
+            get_checkpoint_threads().touch(thread_id)
+        except Exception as e:
+            print(f"Error recording checkpoint thread {thread_id}: {e}")
+        yield
+    finally:
+        with _live_threads_lock:
+            _live_threads.discard(thread_id)
+
+
+def delete_checkpoints(thread_id: Optional[str]) -> None:
+    """
+    Delete the checkpoints of a run that no longer has to be resumed.
+
+    Args:
+        thread_id: The thread ID
+    """
+    if not thread_id:
+        return
+    try:
+        get_checkpointer().delete_thread(thread_id)
+        get_checkpoint_threads().forget(thread_id)
+    except Exception as e:
+        print(f"Error deleting checkpoints of {thread_id}: {e}")
+
+
+def prune_checkpoints(max_age_seconds: float = CHECKPOINT_TTL_SECONDS) -> int:
+    """
+    Delete the checkpoints of the runs that were never resumed, e.g. when the session ended.
+
+    Args:
+        max_age_seconds: Age of the last run of a thread above which its checkpoints are deleted
+
+    Returns:
+        int: Number of threads deleted
+    """
+    try:
+        expired = get_checkpoint_threads().expired(max_age_seconds)
+    except Exception as e:
+        print(f"Error listing expired checkpoints: {e}")
+        return 0
+
+    with _live_threads_lock:
+        expired = [thread_id for thread_id in expired if thread_id not in _live_threads]
+    for thread_id in expired:
+        delete_checkpoints(thread_id)
+    return len(expired)
+
+
+@st.cache_resource
+def start_checkpoint_cleanup() -> threading.Thread:
+    """Prune checkpoints now and then every CHECKPOINT_CLEANUP_INTERVAL_SECONDS, in a background thread, once per process."""
+
+    def cleanup() -> None:
+        while True:
+            prune_checkpoints()
+            time.sleep(CHECKPOINT_CLEANUP_INTERVAL_SECONDS)
+
+    thread = threading.Thread(target=cleanup, name="checkpoint-cleanup", daemon=True)
+    thread.start()
+    return thread
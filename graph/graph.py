@@ -1,7 +1,8 @@
+import streamlit as st
 from langgraph.graph import END, StateGraph, START
 
-from graph.chains.reflection import REFLECTION_END_ANSWER
 from graph.chains.spare_parts_extraction import SPARE_PARTS_EXTRACTION_END_ANSWER
+from graph.checkpointing import get_checkpointer
 from graph.consts import EXTRACT_SPARE_PARTS, GENERATE, REFLECT, RETRIEVE_AND_GRADE, WEBSEARCH
 from graph.nodes.extract_spare_parts import extract_spare_parts
 from graph.nodes.generate import generate
@@ -9,13 +10,15 @@ from graph.nodes.reflect import reflect
 from graph.nodes.retrieve import retrieve
 from graph.nodes.web_search import web_search
 from graph.state import GraphState
+from utils.cancellation import cancellable_node
+from utils.tracing import traced_node
 
 def reflection_decision_maker(state) -> str:
     print("---ASSESS REFLECTION OUTPUT---")
 
-    if REFLECTION_END_ANSWER in state["reflection_result"].lower() or state["reflection_index"] > 3:
+    if state.get("reflection_exit_reason"):
         print(
-            "---DECISION: USEFUL ANSWER, EXTRACT SPARE PARTS---"
+            f"---DECISION: {state['reflection_exit_reason'].upper()}, EXTRACT SPARE PARTS---"
         )
         return EXTRACT_SPARE_PARTS
     else:
@@ -35,13 +38,19 @@ def spare_parts_extraction_decision_maker(state) -> str:
         return WEBSEARCH
 
 
+def _node(name: str, node):
+    """Trace a node and let a cancelled run stop before it starts"""
+    return traced_node(name, cancellable_node(node))
+
+
+@st.cache_resource
 def get_graph():
     workflow = StateGraph(GraphState)
-    workflow.add_node(RETRIEVE_AND_GRADE, retrieve)
-    workflow.add_node(GENERATE, generate)
-    workflow.add_node(REFLECT, reflect)
-    workflow.add_node(EXTRACT_SPARE_PARTS, extract_spare_parts)
-    workflow.add_node(WEBSEARCH, web_search)
+    workflow.add_node(RETRIEVE_AND_GRADE, _node(RETRIEVE_AND_GRADE, retrieve))
+    workflow.add_node(GENERATE, _node(GENERATE, generate))
+    workflow.add_node(REFLECT, _node(REFLECT, reflect))
+    workflow.add_node(EXTRACT_SPARE_PARTS, _node(EXTRACT_SPARE_PARTS, extract_spare_parts))
+    workflow.add_node(WEBSEARCH, _node(WEBSEARCH, web_search))
 
 
     workflow.add_edge(START, RETRIEVE_AND_GRADE)
@@ -66,7 +75,7 @@ def get_graph():
     workflow.add_edge(WEBSEARCH, END)
 
 
-    app = workflow.compile()
+    app = workflow.compile(checkpointer=get_checkpointer())
     app.get_graph().draw_mermaid_png(output_file_path="graph.png")
     print(app.get_graph().draw_mermaid())
 
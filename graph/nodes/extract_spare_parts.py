@@ -2,18 +2,53 @@
 from graph.state import GraphState
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 
-from graph.chains.spare_parts_extraction import spare_parts_extraction_chain
+from graph.answer_parsing import build_price_question, extract_brand_name, extract_part_numbers
+from graph.chains.spare_parts_extraction import SPARE_PARTS_EXTRACTION_END_ANSWER, llm, spare_parts_extraction_chain
+from utils.llm_scheduler import schedule_llm_call
+from utils.tracing import record_usage, span
 
 
 def spare_parts_extraction_node(messages: list[BaseMessage])-> list[BaseMessage]:
-    res = spare_parts_extraction_chain.invoke({"messages": messages})
+    with span("llm.spare_parts_extraction", model=llm.model_name) as current:
+        res = schedule_llm_call(llm.model_name, lambda: spare_parts_extraction_chain.invoke({"messages": messages}),
+                                prompt="\n".join(m.content for m in messages))
+        record_usage(current, res)
     return  [AIMessage(content=res.content)]
 
-def extract_spare_parts(state: GraphState) -> GraphState:
-    print("---REFLECT---")
+def extract_spare_parts_query(generation: str) -> tuple[str, list[dict[str, str]]]:
+    """
+    Extract the spare parts of an answer and the question used to search their prices.
+
+    Args:
+        generation: The generated answer
+
+    Returns:
+        tuple[str, list[dict[str, str]]]: The price question, or SPARE_PARTS_EXTRACTION_END_ANSWER
+        if the answer has no part numbers, and the parsed parts
+    """
+    parts = extract_part_numbers(generation)
+
+    if parts is None:
+        # The Part Numbers section is missing or ambiguous, fall back to the LLM
+        print("---SPARE PARTS PRE-EXTRACTION: AMBIGUOUS, USING LLM---")
+        results = spare_parts_extraction_node([HumanMessage(content=generation)])
+        return results[0].content, []
 
-    results = spare_parts_extraction_node([HumanMessage(content=state['generation'])])
-    state['spare_parts_generation'] = results[0].content
+    if not parts:
+        return SPARE_PARTS_EXTRACTION_END_ANSWER, []
+
+    return build_price_question(parts, extract_brand_name(generation)), parts
+
+def extract_spare_parts(state: GraphState) -> GraphState:
+    print("---EXTRACT SPARE PARTS---")
+
+    speculation = state.get('speculation')
+    if speculation and speculation['generation'] == state['generation']:
+        print("---USING SPECULATIVE SPARE PARTS EXTRACTION---")
+        state['spare_parts_generation'] = speculation['spare_parts_generation']
+        state['spare_parts'] = speculation['spare_parts']
+    else:
+        state['spare_parts_generation'], state['spare_parts'] = extract_spare_parts_query(state['generation'])
 
     print(f"-------------------------------------> SPARE PARTS EXTRACTION <-------------------------------------")
     print(state['spare_parts_generation'])
@@ -2,39 +2,56 @@
 from graph.state import GraphState
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 
-from graph.chains.generation import generation_chain
+from graph.chains.generation import get_generation_chain
+from utils.chunk_store import get_chunk_store
+from utils.llm_scheduler import schedule_llm_call
+from utils.model_routing import STEP_GENERATION, route
+from utils.tracing import record_usage, span
 
 
-def generation_node(messages: list[BaseMessage])-> list[BaseMessage]:
-    res = generation_chain.invoke({"messages": messages})
-    return  [AIMessage(content=res)]
+def generation_node(messages: list[BaseMessage], complexity: str | None = None)-> list[BaseMessage]:
+    model_route = route(STEP_GENERATION, complexity)
+    generation_chain = get_generation_chain(model_route)
+    with span("llm.generation", model=model_route.model, complexity=complexity) as current:
+        res = schedule_llm_call(model_route.model, lambda: generation_chain.invoke({"messages": messages}),
+                                prompt="\n".join(m.content for m in messages),
+                                max_completion_tokens=model_route.max_tokens)
+        record_usage(current, res)
+    return  [AIMessage(content=res.content)]
+
+
+def question_message(query: str, information: str) -> HumanMessage:
+    return HumanMessage(content=f"""Question: {query}
+
+        Information from document:
+        {information}
+
+        Please provide your thought process and final answer.""")
 
 
 def generate(state: GraphState) -> GraphState:
     print("---GENERATE---")
 
     query = state["question"]
-    documents = state["documents"]
-    information = "\n\n".join(documents)
 
     if 'messages' not in state:
         state['messages'] = []
 
-
-    message = HumanMessage(content=f"""Question: {query}
-
-        Information from document:
-        {information}
-
-        Please provide your thought process and final answer.""")
+    # The state keeps the question without the chunk text, which is only put in the prompt
+    message = HumanMessage(content=f"Question: {query}")
 
     if 'reflection_result' in state and state['reflection_result'] is not None:
         message = HumanMessage(content=state['reflection_result'])
 
     state['messages'].append(message)
 
-    results = generation_node(state['messages'])
+    documents = get_chunk_store().resolve(state["retriever_id"], state.get("chunk_ids") or [])
+    information = "\n\n".join(documents)
+    prompt_messages = [question_message(query, information)] + state['messages'][1:]
+
+    results = generation_node(prompt_messages, state.get('complexity'))
     state["messages"] += results
+    state["previous_generation"] = state.get("generation")
     state["generation"] = results[0].content
 
     print("-------------------------------------> GENETATED <-------------------------------------")
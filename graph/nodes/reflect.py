@@ -1,26 +1,121 @@
+import time
+from difflib import SequenceMatcher
 
 from graph.state import GraphState
 from langchain_core.messages import BaseMessage, HumanMessage
 
-from graph.chains.reflection import reflection_chain
+from config.config import (AGENT_RUN_TIME_BUDGET_SECONDS, REFLECTION_CONVERGENCE_RATIO,
+                           REFLECTION_MAX_ROUNDS, REFLECTION_PRECHECK_ACCEPT_COMPLETE,
+                           SPECULATIVE_SPARE_PARTS)
+from graph.answer_parsing import missing_sections
+from graph.chains.reflection import REFLECTION_END_ANSWER, get_reflection_chain
+from graph.speculation import finish_speculation, start_speculation
+from utils.llm_scheduler import schedule_llm_call
+from utils.model_routing import STEP_REFLECTION, route
+from utils.tracing import record_usage, span
 
+EXIT_ACCEPTED = "accepted"
+EXIT_MAX_ROUNDS = "max_rounds"
+EXIT_CONVERGED = "converged"
+EXIT_TIME_BUDGET = "time_budget"
 
-def reflection_node(messages: list[BaseMessage])-> list[BaseMessage]:
-    res = reflection_chain.invoke({"messages": messages})
+
+def reflection_node(messages: list[BaseMessage], complexity: str | None = None)-> list[BaseMessage]:
+    model_route = route(STEP_REFLECTION, complexity)
+    reflection_chain = get_reflection_chain(model_route)
+    with span("llm.reflection", model=model_route.model, complexity=complexity) as current:
+        res = schedule_llm_call(model_route.model, lambda: reflection_chain.invoke({"messages": messages}),
+                                prompt="\n".join(m.content for m in messages),
+                                max_completion_tokens=model_route.max_tokens)
+        record_usage(current, res)
     return  [HumanMessage(content=res.content)]
 
+def reflection_precheck(generation: str) -> str | None:
+    """
+    Check the structure of an answer without calling the reflection LLM.
+
+    Args:
+        generation: The generated answer
+
+    Returns:
+        str | None: The critique to use, or None if the LLM still has to review the answer
+    """
+    missing = missing_sections(generation)
+
+    if missing:
+        return (f"The answer is missing the following sections: {', '.join(missing)}. "
+                "Please provide the answer again containing the Thought Process, Final Answer, "
+                "Brand name and Part Numbers sections, and fill in what is missing.")
+
+    if REFLECTION_PRECHECK_ACCEPT_COMPLETE:
+        return REFLECTION_END_ANSWER
+
+    return None
+
+def reflection_exit_reason(state: GraphState) -> str | None:
+    """
+    Decide whether the generate/reflect loop should stop after this reflection.
+
+    Args:
+        state: The graph state after the reflection result and index are set
+
+    Returns:
+        str | None: The reason the loop terminates, or None to run another round
+    """
+    if REFLECTION_END_ANSWER in state['reflection_result'].lower():
+        return EXIT_ACCEPTED
+
+    if state['reflection_index'] >= REFLECTION_MAX_ROUNDS:
+        return EXIT_MAX_ROUNDS
+
+    previous_generation = state.get('previous_generation')
+    if previous_generation:
+        similarity = SequenceMatcher(None, previous_generation, state['generation']).ratio()
+        print(f"---GENERATION SIMILARITY: {similarity:.3f}---")
+        if similarity >= REFLECTION_CONVERGENCE_RATIO:
+            return EXIT_CONVERGED
+
+    run_started_at = state.get('run_started_at')
+    if run_started_at:
+        # Assume the next round takes as long as the average one so far
+        elapsed = time.time() - run_started_at
+        if elapsed + elapsed / state['reflection_index'] > AGENT_RUN_TIME_BUDGET_SECONDS:
+            return EXIT_TIME_BUDGET
+
+    return None
+
 def reflect(state: GraphState) -> GraphState:
     print("---REFLECT---")
 
-    results = reflection_node([HumanMessage(content=state['generation'])])
-    state['reflection_result'] = results[0].content
+    speculation = None
+    state['speculation'] = None
+
+    with span("reflection.precheck") as current:
+        precheck_result = reflection_precheck(state['generation'])
+        current.set(skipped_llm=precheck_result is not None)
+
+    if precheck_result is not None:
+        print("---REFLECTION PRECHECK: SKIPPING REFLECTION LLM---")
+        state['reflection_result'] = precheck_result
+    else:
+        if SPECULATIVE_SPARE_PARTS:
+            speculation = start_speculation(state['generation'])
+
+        results = reflection_node([HumanMessage(content=state['generation'])], state.get('complexity'))
+        state['reflection_result'] = results[0].content
 
     if 'reflection_index' not in state:
         state['reflection_index'] = 0
     state['reflection_index'] += 1
+    state['reflection_exit_reason'] = reflection_exit_reason(state)
+
+    if speculation:
+        state['speculation'] = finish_speculation(*speculation, accepted=bool(state['reflection_exit_reason']))
 
     print(f"-------------------------------------> REFLECTION ({state['reflection_index']}) <-------------------------------------")
     print(state['reflection_result'])
+    if state['reflection_exit_reason']:
+        print(f"---REFLECTION LOOP EXIT: {state['reflection_exit_reason']}---")
     print("--------------------------------------------------------------------------")
 
     return state
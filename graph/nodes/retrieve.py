@@ -1,15 +1,29 @@
+import time
+
 from graph.state import GraphState
 from prompts.rag_query import augment_multiple_query
 from utils.ai_utils import rag_ai_retriever
+from utils.chunk_store import get_chunk_store
+from utils.model_routing import classify_query
 
 
 def retrieve(state: GraphState) -> GraphState:
     print("---RETRIEVE---")
+    run_started_at = time.time()
     question = state["question"]
     retriever_id = state["retriever_id"]
 
-    augmented_queries = augment_multiple_query(question)
+    augmented_queries = augment_multiple_query(question, classify_query(question))
     queries = [question] + augmented_queries
 
-    ranked_retrieved_documents = rag_ai_retriever(queries, retriever_id)
-    return {"documents": ranked_retrieved_documents, "question": question}
+    chunk_ids, ranked_retrieved_documents, scores = rag_ai_retriever(queries, retriever_id)
+
+    # The state only carries the chunk ids, the text is resolved where the prompt is built
+    get_chunk_store().put(retriever_id, chunk_ids, ranked_retrieved_documents)
+
+    # The scores tell whether the answer is in one chunk or spread over several
+    complexity = classify_query(question, scores)
+    print(f"---QUERY COMPLEXITY: {complexity}---")
+
+    return {"chunk_ids": chunk_ids, "chunk_scores": scores, "question": question,
+            "run_started_at": run_started_at, "complexity": complexity}
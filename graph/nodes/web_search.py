@@ -1,26 +1,116 @@
-from langchain_core.documents import Document
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
 from langchain_tavily import TavilySearch
 
+from config.config import TAVILY_BASE_URL, WEB_SEARCH_CACHE_TTL_SECONDS, WEB_SEARCH_MAX_WORKERS
+from graph.answer_parsing import extract_brand_name
 from graph.state import GraphState
+from utils.cache import TTLCache
+from utils.cancellation import check_cancelled
+from utils.tracing import span
+
+# Only override the API URL when pointing at the stub server
+web_search_kwargs = {"api_base_url": TAVILY_BASE_URL} if TAVILY_BASE_URL else {}
+web_search_tool = TavilySearch(max_results=5, **web_search_kwargs)
+
+# Search results per normalized part number, shared by every session of the process
+part_search_cache = TTLCache(ttl_seconds=WEB_SEARCH_CACHE_TTL_SECONDS)
+
+
+def normalize_part_number(number: str) -> str:
+    """Normalize a part number so that "6205-2RS" and "6205 2rs" share a cache entry."""
+    return re.sub(r"[^A-Z0-9]", "", number.upper())
+
+
+def _search(query: str) -> list[dict]:
+    check_cancelled()
+    with span("search.tavily"):
+        result_of_search = web_search_tool.invoke({"query": query})
+
+    if 'error' in result_of_search:
+        raise result_of_search["error"]
+
+    return result_of_search["results"]
+
+
+def search_part(part: dict[str, str], brand: str = "") -> list[dict]:
+    """
+    Search the web for the price of a single part, using the cache when possible.
 
-web_search_tool = TavilySearch(max_results=5)
+    Args:
+        part: Part as a {'name', 'number'} dict
+        brand: Brand and model of the equipment
+
+    Returns:
+        list[dict]: The search results
+    """
+    key = normalize_part_number(part['number'])
+
+    with span("search.part", part_number=part['number']) as current:
+        results = part_search_cache.get(key)
+        current.set(cache_hit=results is not None)
+        if results is not None:
+            print(f"---WEB SEARCH CACHE HIT: {part['number']}---")
+            return results
+
+        query = " ".join(f"{brand} {part['name']} part number {part['number']} price".split())
+        results = _search(query)
+        part_search_cache.set(key, results)
+
+        return results
+
+
+def search_prices(spare_parts: list[dict[str, str]], brand: str = "", fallback_query: str = "") -> list[str]:
+    """
+    Search the web for the prices of spare parts, one query per part.
+
+    Args:
+        spare_parts: Parts as {'name', 'number'} dicts
+        brand: Brand and model of the equipment
+        fallback_query: Single query used when no parts could be parsed
+
+    Returns:
+        list[str]: One "url : content" entry per unique result URL
+    """
+    if spare_parts:
+        with ThreadPoolExecutor(max_workers=min(WEB_SEARCH_MAX_WORKERS, len(spare_parts))) as pool:
+            # Each task gets its own copy of the context so its spans join the current run
+            futures = [pool.submit(copy_context().run, search_part, part, brand) for part in spare_parts]
+            results_per_part = [future.result() for future in futures]
+    else:
+        results_per_part = [_search(fallback_query)]
+
+    price_documents = []
+    seen_urls = set()
+    for results in results_per_part:
+        for result in results:
+            if result['url'] in seen_urls:
+                continue
+            seen_urls.add(result['url'])
+            price_documents.append(f"{result['url']} : {result['content']}")
+
+    return price_documents
 
 
 def web_search(state: GraphState) -> GraphState:
     print("---WEB SEARCH---")
-    question = state["spare_parts_generation"]
-
-    result_of_search = web_search_tool.invoke({"query": question})
 
     if 'price_documents' not in state:
         state['price_documents'] = []
 
-    if 'error' in result_of_search:
-        raise result_of_search["error"]
-    
-    for result in result_of_search["results"]:
-        state['price_documents'].append(
-            f"{result['url']} : {result['content']}")
+    speculation = state.get('speculation')
+    if speculation and speculation['generation'] == state['generation'] \
+            and speculation['price_documents'] is not None:
+        print("---USING SPECULATIVE WEB SEARCH---")
+        state['price_documents'] += speculation['price_documents']
+    else:
+        state['price_documents'] += search_prices(
+            state.get('spare_parts') or [],
+            extract_brand_name(state['generation']),
+            state["spare_parts_generation"],
+        )
 
     prices_information = "\n\n".join(state['price_documents'])
 
@@ -0,0 +1,89 @@
+"""
+Entry point for running a query through the agent graph.
+"""
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from graph.checkpointing import checkpoint_thread_id, claim_thread, delete_checkpoints
+from graph.graph import get_graph
+from modules.file.file_model import FileModel
+from modules.link.link_model import LinkModel
+from utils.ai_utils import get_retriever_id
+from utils.tracing import trace_run
+
+
+def run_agent_query(query: str, files: Optional[List[FileModel]] = None,
+                    links: Optional[List[LinkModel]] = None,
+                    retriever_id: Optional[str] = None,
+                    session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Process a query with the agent graph.
+
+    The run is checkpointed after each node. When the same question was asked in the same
+    session and its run was interrupted or failed, e.g. at the web search, it resumes from
+    its last completed node instead of starting over, with a new time budget.
+
+    Args:
+        query: The user's query
+        files: List of associated files
+        links: List of associated links
+        retriever_id: ID of an existing index, used instead of files and links
+        session_id: ID of the user's session, runs without a session are never resumed
+
+    Returns:
+        Dict: Result with the answer and the run events
+
+    Raises:
+        RunInProgressError: If the previous run of the question has not stopped yet
+    """
+    retriever_id = retriever_id or get_retriever_id(files or [], links or [])
+    inputs = {"question": query, "retriever_id": retriever_id}
+
+    if session_id:
+        thread_id = checkpoint_thread_id(session_id, query, retriever_id)
+    else:
+        thread_id = str(uuid.uuid4())
+    config = {"configurable": {"thread_id": thread_id}}
+
+    with claim_thread(thread_id), trace_run("agent", question=query, retriever_id=retriever_id) as trace:
+        app = get_graph()
+
+        snapshot = app.get_state(config)
+        resumed_at = list(snapshot.next)
+        if resumed_at:
+            print(f"---RESUMING RUN AT {', '.join(resumed_at).upper()}---")
+            trace.attributes['resumed_at'] = resumed_at
+            # The time budget counts from the resume, not from the start of the failed run
+            app.update_state(config, {"run_started_at": time.time()})
+            final_state = app.invoke(None, config)
+        else:
+            if snapshot.values:
+                # Left over from a run that completed, it must not leak into this one
+                delete_checkpoints(thread_id)
+            try:
+                final_state = app.invoke(inputs, config)
+            finally:
+                if not session_id:
+                    delete_checkpoints(thread_id)
+
+        # The run completed, asking the question again starts a new run
+        delete_checkpoints(thread_id)
+
+        trace.attributes['reflection_exit_reason'] = final_state.get('reflection_exit_reason')
+        trace.attributes['reflection_rounds'] = final_state.get('reflection_index', 0)
+
+    events = []
+    if resumed_at:
+        events.append(f"Resumed the interrupted run at {', '.join(resumed_at)}.")
+    events += [
+        f"Reflection loop ended ({final_state.get('reflection_exit_reason')}) "
+        f"after {final_state.get('reflection_index', 0)} round(s).",
+        trace.summary(),
+    ]
+
+    return {
+        "question": query,
+        "answer": final_state["generation"],
+        "events": events
+    }
@@ -0,0 +1,86 @@
+"""
+Speculative spare parts extraction and web search, run while a draft is being reflected on.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import copy_context
+
+from graph.answer_parsing import extract_brand_name
+from graph.chains.spare_parts_extraction import SPARE_PARTS_EXTRACTION_END_ANSWER
+from graph.nodes.extract_spare_parts import extract_spare_parts_query
+from graph.nodes.web_search import search_prices
+from utils.tracing import span
+
+
+def speculate_spare_parts(generation: str) -> dict:
+    """
+    Extract the spare parts of a draft and search their prices.
+
+    Args:
+        generation: The draft answer
+
+    Returns:
+        dict: The draft with its extraction and price documents, price_documents is None
+        if the search failed and has to be run again
+    """
+    spare_parts_generation, spare_parts = extract_spare_parts_query(generation)
+
+    price_documents = []
+    if SPARE_PARTS_EXTRACTION_END_ANSWER not in spare_parts_generation.lower():
+        try:
+            price_documents = search_prices(spare_parts, extract_brand_name(generation), spare_parts_generation)
+        except Exception as e:
+            print(f"Error in speculative web search: {e}")
+            price_documents = None
+
+    return {
+        "generation": generation,
+        "spare_parts_generation": spare_parts_generation,
+        "spare_parts": spare_parts,
+        "price_documents": price_documents,
+    }
+
+
+def _traced_speculation(generation: str) -> dict:
+    with span("speculation.spare_parts"):
+        return speculate_spare_parts(generation)
+
+
+def start_speculation(generation: str) -> tuple[ThreadPoolExecutor, Future]:
+    """
+    Start speculate_spare_parts in a background thread.
+
+    Args:
+        generation: The draft answer
+
+    Returns:
+        tuple[ThreadPoolExecutor, Future]: The executor running the speculation and its future
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    return executor, executor.submit(copy_context().run, _traced_speculation, generation)
+
+
+def finish_speculation(executor: ThreadPoolExecutor, future: Future, accepted: bool) -> dict | None:
+    """
+    Collect the result of a speculation if its draft was accepted, otherwise discard it.
+
+    Args:
+        executor: The executor returned by start_speculation
+        future: The future returned by start_speculation
+        accepted: Whether the reflection loop ends with this draft
+
+    Returns:
+        dict | None: The speculation result, or None if it was discarded or failed
+    """
+    if not accepted:
+        # Don't wait for the discarded work, it finishes in the background
+        future.cancel()
+        executor.shutdown(wait=False)
+        return None
+
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Error in speculative spare parts extraction: {e}")
+        return None
+    finally:
+        executor.shutdown(wait=False)
@@ -10,9 +10,16 @@ class GraphState(TypedDict):
         retriever_id: The id used to fetch the correct collection
         question: question
         generation: LLM generation
+        previous_generation: generation of the previous reflection round
+        reflection_exit_reason: why the reflection loop terminated, None while it continues
+        run_started_at: epoch time at which the run started
+        complexity: complexity of the question, used to route the LLM steps to a model
         spare_parts_generation: whether to search for the price or not
+        spare_parts: part names and numbers parsed from the generation
+        speculation: spare parts extraction and web search run concurrently with the last reflection
         web_search: whether to add search
-        documents: list of documents
+        chunk_ids: ids of the retrieved chunks, best first, their text is kept in the chunk store
+        chunk_scores: rerank scores of the retrieved chunks
         price_documents: list of documents
     """
 
@@ -21,7 +28,14 @@ class GraphState(TypedDict):
     generation: str
     reflection_result: str
     reflection_index: int = 0
+    reflection_exit_reason: str | None
+    previous_generation: str | None
+    run_started_at: float
+    complexity: str | None
     spare_parts_generation: str
-    documents: list[str]
+    spare_parts: list[dict[str, str]] = []
+    speculation: dict | None
+    chunk_ids: list[str]
+    chunk_scores: list[float]
     price_documents: list[str] = []
     messages: list[BaseMessage] = []
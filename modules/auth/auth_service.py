@@ -3,24 +3,36 @@ Authentication service for the Streamlit AMA.
 """
 
 import hashlib
+import threading
 import uuid
-from typing import Dict, Optional, Any
+from typing import Any, ClassVar, Dict, Optional
 from dataclasses import dataclass
 import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import streamlit as st
 
-from config.config import SESSION_DURATION_IN_DAYS
-from utils.db_conneciton import db_conneciton
+from config.config import (SESSION_CACHE_MAX_SIZE, SESSION_CACHE_TTL_SECONDS, SESSION_CLEANUP_INTERVAL_SECONDS,
+                           SESSION_DURATION_IN_DAYS)
+from utils.cache import TTLCache
+from utils.db_conneciton import DIALECT_SQLITE, db_conneciton, get_storage_backend
+from utils.query import fetch_all, fetch_one
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     """User model for authentication."""
+    # Columns of the users table read by from_row, in order
+    COLUMNS: ClassVar[str] = "user_id, email, name"
+
     email: str
     user_id: str
     name: Optional[str] = None
 
+    @classmethod
+    def from_row(cls, user_id: str, email: str, name: Optional[str]) -> 'User':
+        """Create a User from a row of COLUMNS."""
+        return cls(email=email, user_id=user_id, name=name)
+
     def to_dict(self) -> Dict[str, Any]:
         """Convert user to dictionary."""
         return {
@@ -35,55 +47,30 @@ class AuthService:
 
     def __init__(self):
         """Initialize the authentication service."""
-        self._initialize_db()
-        self._initialize_predefined_users()
-        self.delete_expired_sessions()
+        # Validated sessions as (user, expires_at), shared by every Streamlit session of the process
+        self._session_cache = TTLCache(ttl_seconds=SESSION_CACHE_TTL_SECONDS, max_size=SESSION_CACHE_MAX_SIZE)
+        self._cleanup_stop = threading.Event()
+        self._cleanup_thread: Optional[threading.Thread] = None
 
-    def _initialize_db(self) -> None:
-        """Initialize the SQLite database for authentication."""
-        # Connect to the database
-        with db_conneciton() as cursor:
-            # Create users table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                name TEXT,
-                created_at TIMESTAMP NOT NULL
-            )
-            ''')
-            cursor.execute('ALTER TABLE users ENABLE ROW LEVEL SECURITY;')
-
-            # Create sessions table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS sessions (
-                session_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                created_at TIMESTAMP NOT NULL,
-                expires_at TIMESTAMP NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            ''')
-            cursor.execute('ALTER TABLE sessions ENABLE ROW LEVEL SECURITY;')
-
-    def _initialize_predefined_users(self) -> None:
-        """Initialize predefined users in the database."""
+    def seed_predefined_users(self) -> None:
+        """Create the predefined users that are missing from the database."""
         # Load predefined users from config
-        for user_data in st.secrets.auth["PREDEFINED_USERS"]:
-            email = user_data['email']
-            password = user_data['password']
-            name = user_data.get('name', '')
+        predefined_users = st.secrets.auth["PREDEFINED_USERS"]
 
-            # Check if user already exists
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    "SELECT email FROM users WHERE email = %s", (email,))
-                exists = cursor.fetchone()
+        emails = [user_data['email'] for user_data in predefined_users]
+        if not emails:
+            return
 
-            if not exists:
+        # Check which users already exist in a single query
+        with db_conneciton() as cursor:
+            cursor.execute(
+                f"SELECT email FROM users WHERE email IN ({', '.join(['%s'] * len(emails))})", emails)
+            existing_emails = {row[0] for row in cursor.fetchall()}
+
+        for user_data in predefined_users:
+            if user_data['email'] not in existing_emails:
                 # Add user to database
-                self.create_user(email, password, name)
+                self.create_user(user_data['email'], user_data['password'], user_data.get('name', ''))
 
     def _get_salt(self) -> str:
         """Get the salt for password hashing."""
@@ -118,13 +105,12 @@ class AuthService:
         try:
             user_id = str(uuid.uuid4())
             password_hash = self._hash_password(password)
-            created_at = datetime.now().isoformat()
 
             with db_conneciton() as cursor:
                 # Insert user into database
                 cursor.execute(
-                    "INSERT INTO users (user_id, email, password_hash, name, created_at) VALUES (%s, %s, %s, %s, %s)",
-                    (user_id, email, password_hash, name, created_at)
+                    "INSERT INTO users (user_id, email, password_hash, name, created_at) VALUES (%s, %s, %s, %s, now())",
+                    (user_id, email, password_hash, name)
                 )
 
             return User(email=email, user_id=user_id, name=name)
@@ -149,20 +135,10 @@ class AuthService:
         try:
             password_hash = self._hash_password(password)
 
-            with db_conneciton() as cursor:
-                # Find user with matching email and password
-                cursor.execute(
-                    "SELECT user_id, email, name FROM users WHERE email = %s AND password_hash = %s",
-                    (email, password_hash)
-                )
-
-                user_data = cursor.fetchone()
-
-            if user_data:
-                user_id, email, name = user_data
-                return User(email=email, user_id=user_id, name=name)
-
-            return None
+            # Find user with matching email and password
+            return fetch_one(
+                f"SELECT {User.COLUMNS} FROM users WHERE email = %s AND password_hash = %s",
+                (email, password_hash), User.from_row)
         except Exception as e:
             print(f"Error authenticating user: {e}")
             return None
@@ -179,16 +155,26 @@ class AuthService:
         """
         try:
             session_id = str(uuid.uuid4())
-            created_at = datetime.now().isoformat()
-            expires_at = (datetime.now() +
-                          timedelta(days=SESSION_DURATION_IN_DAYS)).isoformat()
 
             with db_conneciton() as cursor:
-                # Insert session into database
-                cursor.execute(
-                    "INSERT INTO sessions (session_id, user_id, created_at, expires_at) VALUES (%s, %s, %s, %s)",
-                    (session_id, user.user_id, created_at, expires_at)
-                )
+                if get_storage_backend().dialect == DIALECT_SQLITE:
+                    # An embedded database has the clock of this process
+                    expires_at = datetime.now(timezone.utc) + timedelta(days=SESSION_DURATION_IN_DAYS)
+                    cursor.execute(
+                        "INSERT INTO sessions (session_id, user_id, created_at, expires_at) "
+                        "VALUES (%s, %s, now(), %s)",
+                        (session_id, user.user_id, expires_at)
+                    )
+                else:
+                    # Insert session into database, timestamps come from the database clock it is compared to
+                    cursor.execute(
+                        "INSERT INTO sessions (session_id, user_id, created_at, expires_at) "
+                        "VALUES (%s, %s, now(), now() + %s * INTERVAL '1 day') RETURNING expires_at",
+                        (session_id, user.user_id, SESSION_DURATION_IN_DAYS)
+                    )
+                    expires_at = cursor.fetchone()[0]
+
+            self._session_cache.set(session_id, (user, expires_at))
 
             return session_id
         except Exception as e:
@@ -205,24 +191,34 @@ class AuthService:
         Returns:
             Optional[User]: The user associated with the session or None if invalid
         """
+        cached = self._session_cache.get(session_id)
+        if cached is not None:
+            user, expires_at = cached
+            if expires_at > datetime.now(timezone.utc):
+                return user
+            self._session_cache.delete(session_id)
+            return None
+
         try:
             with db_conneciton() as cursor:
                 # Find session and check if it's expired
                 cursor.execute(
                     """
-                    SELECT s.user_id, u.email, u.name
+                    SELECT u.user_id, u.email, u.name, s.expires_at
                     FROM sessions s
                     JOIN users u ON s.user_id = u.user_id
-                    WHERE s.session_id = %s AND s.expires_at > %s
+                    WHERE s.session_id = %s AND s.expires_at > now()
                     """,
-                    (session_id, datetime.now().isoformat())
+                    (session_id,)
                 )
 
                 session_data = cursor.fetchone()
 
             if session_data:
-                user_id, email, name = session_data
-                return User(email=email, user_id=user_id, name=name)
+                *user_data, expires_at = session_data
+                user = User.from_row(*user_data)
+                self._session_cache.set(session_id, (user, expires_at))
+                return user
 
             return None
         except Exception as e:
@@ -239,6 +235,7 @@ class AuthService:
         Returns:
             bool: True if successful, False otherwise
         """
+        self._session_cache.delete(session_id)
         try:
             with db_conneciton() as cursor:
                 # Delete session from database
@@ -264,13 +261,31 @@ class AuthService:
             with db_conneciton() as cursor:
                 # Delete session from database
                 cursor.execute(
-                    "DELETE FROM sessions WHERE expires_at < %s", (datetime.now().isoformat(),))
+                    "DELETE FROM sessions WHERE expires_at < now()")
 
             return True
         except Exception as e:
             print(f"Error deleting sessions: {e}")
             return False
 
+    def start_session_cleanup(self) -> None:
+        """Delete expired sessions now and then every SESSION_CLEANUP_INTERVAL_SECONDS, in a background thread."""
+        if self._cleanup_thread is not None:
+            return
+
+        def cleanup() -> None:
+            while True:
+                self.delete_expired_sessions()
+                if self._cleanup_stop.wait(SESSION_CLEANUP_INTERVAL_SECONDS):
+                    return
+
+        self._cleanup_thread = threading.Thread(target=cleanup, name="session-cleanup", daemon=True)
+        self._cleanup_thread.start()
+
+    def stop_session_cleanup(self) -> None:
+        """Stop the thread started by start_session_cleanup."""
+        self._cleanup_stop.set()
+
     def get_user(self, user_id: str) -> Optional[User]:
         """
         Get a user by ID.
@@ -282,20 +297,7 @@ class AuthService:
             Optional[User]: The user or None if not found
         """
         try:
-            with db_conneciton() as cursor:
-                # Find user by ID
-                cursor.execute(
-                    "SELECT user_id, email, name FROM users WHERE user_id = %s",
-                    (user_id,)
-                )
-
-                user_data = cursor.fetchone()
-
-            if user_data:
-                user_id, email, name = user_data
-                return User(email=email, user_id=user_id, name=name)
-
-            return None
+            return fetch_one(f"SELECT {User.COLUMNS} FROM users WHERE user_id = %s", (user_id,), User.from_row)
         except Exception as e:
             print(f"Error getting user: {e}")
             return None
@@ -311,20 +313,7 @@ class AuthService:
             Optional[User]: The user or None if not found
         """
         try:
-            with db_conneciton() as cursor:
-                # Find user by email
-                cursor.execute(
-                    "SELECT user_id, email, name FROM users WHERE email = %s",
-                    (email,)
-                )
-
-                user_data = cursor.fetchone()
-
-            if user_data:
-                user_id, email, name = user_data
-                return User(email=email, user_id=user_id, name=name)
-
-            return None
+            return fetch_one(f"SELECT {User.COLUMNS} FROM users WHERE email = %s", (email,), User.from_row)
         except Exception as e:
             print(f"Error getting user by email: {e}")
             return None
@@ -337,21 +326,7 @@ class AuthService:
             list[User]: List of all users
         """
         try:
-            with db_conneciton() as cursor:
-                # Find user by ID
-                cursor.execute(
-                    "SELECT user_id, email, name FROM users"
-                )
-
-                rows = cursor.fetchall()
-
-            users = []
-            for row in rows:
-                user_id, email, name = row
-                users.append(User(email=email, user_id=user_id, name=name))
-
-            return users
-
+            return fetch_all(f"SELECT {User.COLUMNS} FROM users", (), User.from_row)
         except Exception as e:
             print(f"Error getting users: {e}")
             return None
@@ -1,18 +1,29 @@
 """
 Link model for representing external links in the application.
 """
+import json
 from dataclasses import dataclass
+from datetime import datetime
+from typing import ClassVar
 
-@dataclass
+@dataclass(slots=True)
 class FeedbackQuestionModel:
     """
     Model representing a feedback question
     """
+    # Columns of the questions table read by from_row, in order
+    COLUMNS: ClassVar[str] = "question_id, question, answers"
+
     id: str
     question: str
     answers: list[str]
 
-@dataclass
+    @classmethod
+    def from_row(cls, question_id: str, question: str, answers: str) -> 'FeedbackQuestionModel':
+        """Create a FeedbackQuestionModel from a row of COLUMNS, the answers being a JSON list."""
+        return cls(id=question_id, question=question, answers=json.loads(answers))
+
+@dataclass(slots=True)
 class FeedbackUserAnswerModel:
     """
     Model representing a user answer for a single question
@@ -31,7 +42,7 @@ class FeedbackUserAnswerModel:
         except Exception:
             return None
 
-@dataclass
+@dataclass(slots=True)
 class FeedbackModel:
     """
     Model representing a user feedback submission
@@ -42,6 +53,11 @@ class FeedbackModel:
     comment: str
     created_at: str | None = None
 
+    def __post_init__(self):
+        """Format timestamps read from the database like the ones created by the app."""
+        if isinstance(self.created_at, datetime):
+            self.created_at = self.created_at.isoformat()
+
     def can_be_submitted(self):
         if self.comment is None or self.comment == "":
             return False
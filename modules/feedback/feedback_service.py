@@ -1,13 +1,73 @@
 """
 Service for managing feedback questions in the application.
 """
+import csv
+import io
 import uuid
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Iterator
 import streamlit as st
 
+from config.config import FEEDBACK_QUESTIONS_CACHE_TTL_SECONDS
 from modules.feedback.feedback_model import FeedbackModel, FeedbackQuestionModel, FeedbackUserAnswerModel
-from utils.db_conneciton import db_conneciton
+from utils.cache import TTLCache
+from utils.db_conneciton import DIALECT_POSTGRES, DIALECT_SQLITE, db_conneciton, get_storage_backend
+from utils.query import fetch_all
+
+QUESTIONS_CACHE_KEY = "questions"
+FEEDBACK_EXPORT_FIELDS = ["email", "question", "answer", "comment"]
+
+# One row per user and question, with the user's latest answer to it if any
+FEEDBACK_EXPORT_QUERY = {
+    DIALECT_POSTGRES: """
+        SELECT u.email,
+               q.question,
+               COALESCE(a.answers -> q.question_id ->> 'answer', ''),
+               COALESCE(a.answers -> q.question_id ->> 'comment', '')
+        FROM users u
+        CROSS JOIN questions q
+        LEFT JOIN LATERAL (
+            SELECT answers
+            FROM answers
+            WHERE answers.user_id = u.user_id
+            ORDER BY created_at DESC
+            LIMIT 1
+        ) a ON true
+        ORDER BY u.email, q.question_id
+        """,
+    DIALECT_SQLITE: """
+        SELECT u.email,
+               q.question,
+               COALESCE(json_extract(a.answers, '$."' || q.question_id || '".answer'), ''),
+               COALESCE(json_extract(a.answers, '$."' || q.question_id || '".comment'), '')
+        FROM users u
+        CROSS JOIN questions q
+        LEFT JOIN answers a ON a.answer_id = (
+            SELECT answer_id
+            FROM answers
+            WHERE answers.user_id = u.user_id
+            ORDER BY created_at DESC
+            LIMIT 1
+        )
+        ORDER BY u.email, q.question_id
+        """,
+}
+
+ANSWER_DISTRIBUTION_QUERY = {
+    DIALECT_POSTGRES: """
+        SELECT q.question_id, a.answers -> q.question_id ->> 'answer', count(a.answer_id)
+        FROM questions q
+        LEFT JOIN answers a ON a.answers ? q.question_id
+        GROUP BY 1, 2
+        """,
+    DIALECT_SQLITE: """
+        SELECT q.question_id, json_extract(a.answers, '$."' || q.question_id || '".answer'), count(a.answer_id)
+        FROM questions q
+        LEFT JOIN answers a ON json_type(a.answers, '$."' || q.question_id || '"') IS NOT NULL
+        GROUP BY 1, 2
+        """,
+}
 
 
 class FeedbackService:
@@ -16,51 +76,28 @@ class FeedbackService:
     """
 
     def __init__(self):
-        """Initialize the LinkService."""
-        self._initialize_db()
-        self._initialize_predefined_questions()
+        """Initialize the FeedbackService."""
+        self._questions_cache = TTLCache(ttl_seconds=FEEDBACK_QUESTIONS_CACHE_TTL_SECONDS, max_size=1)
 
-    def _initialize_db(self) -> None:
-        """Initialize the database tables for link storage."""
-        with db_conneciton() as cursor:
-            # Create tables
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS questions (
-                question_id TEXT PRIMARY KEY,
-                question TEXT NOT NULL,
-                answers TEXT NOT NULL
-            )
-            ''')
-            cursor.execute('ALTER TABLE questions ENABLE ROW LEVEL SECURITY;')
-
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS answers (
-                answer_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                answers TEXT NOT NULL,
-                comment TEXT NOT NULL,
-                created_at TIMESTAMP NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            ''')
-            cursor.execute('ALTER TABLE answers ENABLE ROW LEVEL SECURITY;')
+    def seed_predefined_questions(self) -> None:
+        """Create the predefined questions that are missing from the database."""
+        # Load predefined questions from config
+        predefined_questions = st.secrets.feedback["PREDEFINED_QUESTIONS"]
 
-    def _initialize_predefined_questions(self) -> None:
-        """Initialize predefined users in the database."""
-        # Load predefined users from config
-        for user_data in st.secrets.feedback["PREDEFINED_QUESTIONS"]:
-            question = user_data['question']
-            answers = user_data['answers']
+        texts = [question_data['question'] for question_data in predefined_questions]
+        if not texts:
+            return
 
-            # Check if user already exists
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    "SELECT question FROM questions WHERE question = %s", (question,))
-                exists = cursor.fetchone()
+        # Check which questions already exist in a single query
+        with db_conneciton() as cursor:
+            cursor.execute(
+                f"SELECT question FROM questions WHERE question IN ({', '.join(['%s'] * len(texts))})", texts)
+            existing_questions = {row[0] for row in cursor.fetchall()}
 
-            if not exists:
-                # Add user to database
-                self.create_question(question, answers)
+        for question_data in predefined_questions:
+            if question_data['question'] not in existing_questions:
+                # Add question to database
+                self.create_question(question_data['question'], question_data['answers'])
 
     def get_all_questions(self) -> list[FeedbackQuestionModel]:
         """
@@ -69,27 +106,15 @@ class FeedbackService:
         Returns:
             List[FeedbackQuestionModel]: List of all question models
         """
-        try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT question_id, question, answers
-                    FROM questions
-                    """
-                )
-
-                rows = cursor.fetchall()
-
-            questions: list[FeedbackQuestionModel] = []
-            for row in rows:
-                question_id, question, answers = row
+        questions = self._questions_cache.get(QUESTIONS_CACHE_KEY)
+        if questions is not None:
+            return questions
 
-                questions.append(FeedbackQuestionModel(
-                    id=question_id,
-                    question=question,
-                    answers=json.loads(answers),
-                ))
+        try:
+            questions = fetch_all(
+                f"SELECT {FeedbackQuestionModel.COLUMNS} FROM questions", (), FeedbackQuestionModel.from_row)
 
+            self._questions_cache.set(QUESTIONS_CACHE_KEY, questions)
             return questions
         except Exception as e:
             print(f"Error getting all questions: {e}")
@@ -110,6 +135,7 @@ class FeedbackService:
                 cursor.execute(
                     "DELETE FROM questions WHERE question_id = %s", (question_id,))
 
+            self._questions_cache.clear()
             return True
         except Exception as e:
             print(f"Error deleting link: {e}")
@@ -147,6 +173,7 @@ class FeedbackService:
                     (question_id, question, json.dumps(answers))
                 )
 
+            self._questions_cache.clear()
             return question_model
         except Exception as e:
             print(f"Error adding question: {e}")
@@ -177,16 +204,18 @@ class FeedbackService:
                 feedback = cursor.fetchone()
 
             if feedback:
+                # jsonb columns are decoded by psycopg2
                 answer_id, user_id, answers, comment, created_at = feedback
-                answers = json.loads(answers)
 
                 return FeedbackModel(
                     id=answer_id,
                     user_id=user_id,
                     comment=comment,
                     created_at=created_at,
-                    answers=[FeedbackUserAnswerModel(question=question, answer=answers[question.id]
-                                                     ['answer'], comment=answers[question.id]['comment']) for question in questions]
+                    answers=[FeedbackUserAnswerModel(question=question,
+                                                     answer=answers.get(question.id, {}).get('answer', ""),
+                                                     comment=answers.get(question.id, {}).get('comment', ""))
+                             for question in questions]
                 )
             else:
                 return FeedbackModel(
@@ -208,33 +237,61 @@ class FeedbackService:
                     question=question, answer="", comment="") for question in questions]
             )
 
-    def answer_exists(self, answer_id: str) -> bool:
-        try:
-            with db_conneciton() as cursor:
-                # Find session and check if it's expired
-                cursor.execute(
-                    """
-                    SELECT answer_id
-                    FROM answers
-                    WHERE answer_id = %s
-                    """,
-                    (answer_id,)
-                )
+    def _iter_feedback_rows(self) -> Iterator[tuple[str, str, str, str]]:
+        with db_conneciton(name="feedback_export") as cursor:
+            cursor.execute(FEEDBACK_EXPORT_QUERY[get_storage_backend().dialect])
 
-                data = cursor.fetchone()
+            yield from cursor
 
-            if data:
-                return True
+    def iter_feedback_export(self, fmt: str = "json") -> Iterator[str]:
+        """
+        Export the feedback of all users with a single query.
 
-            return False
-        except Exception as e:
-            print(f"Error fetching answer: {e}")
-            return None
+        Rows are fetched in batches and written out as they arrive, so the export never
+        holds all the feedback in memory.
+
+        Args:
+            fmt: "json" for {email: {question: {answer, comment}}} or "csv" for one row per user and question
+
+        Returns:
+            Iterator[str]: Chunks of the export
+        """
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(FEEDBACK_EXPORT_FIELDS)
+            for row in self._iter_feedback_rows():
+                writer.writerow(row)
+                if buffer.tell() > 64 * 1024:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+            return
+
+        yield "{"
+        current_email = None
+        for email, question, answer, comment in self._iter_feedback_rows():
+            if email != current_email:
+                yield ("\n    }," if current_email is not None else "") + f"\n    {json.dumps(email)}: {{"
+                separator = ""
+                current_email = email
+            value = json.dumps({"answer": answer, "comment": comment}, indent=4).replace("\n", "\n        ")
+            yield f"{separator}\n        {json.dumps(question)}: {value}"
+            separator = ","
+        yield "\n    }\n}" if current_email is not None else "}"
 
     def upsert_user_answer(self, feedback: FeedbackModel) -> bool:
-        answer_exists = self.answer_exists(feedback.id)
+        """
+        Create or update a user feedback in a single statement.
+
+        Args:
+            feedback: The feedback
 
-        feedback.created_at = datetime.now().isoformat()
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        feedback.created_at = datetime.now(timezone.utc).isoformat()
 
         answers = {}
         for a in feedback.answers:
@@ -245,28 +302,44 @@ class FeedbackService:
 
         try:
             with db_conneciton() as cursor:
-                if answer_exists:
-                    # Update record
-                    cursor.execute(
-                        """
-                        UPDATE answers
-                        SET user_id = %s,
-                            answers = %s,
-                            comment = %s,
-                            created_at = %s
-                        WHERE answer_id = %s
-                        """,
-                        (feedback.user_id, json.dumps(answers),
-                         feedback.comment, feedback.created_at, feedback.id)
-                    )
-                else:
-                    # Insert record
-                    cursor.execute(
-                        "INSERT INTO answers (answer_id, user_id, answers, comment, created_at) VALUES (%s, %s, %s, %s, %s)",
-                        (feedback.id, feedback.user_id, json.dumps(
-                            answers), feedback.comment, feedback.created_at)
-                    )
+                cursor.execute(
+                    """
+                    INSERT INTO answers (answer_id, user_id, answers, comment, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (answer_id) DO UPDATE
+                    SET user_id = EXCLUDED.user_id,
+                        answers = EXCLUDED.answers,
+                        comment = EXCLUDED.comment,
+                        created_at = EXCLUDED.created_at
+                    """,
+                    (feedback.id, feedback.user_id, answers, feedback.comment, feedback.created_at)
+                )
             return True
         except Exception as e:
             print(f"Error upserting answer: {e}")
             return False
+
+    def get_answer_distribution(self) -> dict[str, dict[str, int]]:
+        """
+        Count the answers given to each question, in SQL.
+
+        Returns:
+            dict: Question id mapped to the number of users who gave each answer, questions
+                without answers map to an empty dict
+        """
+        try:
+            with db_conneciton() as cursor:
+                cursor.execute(ANSWER_DISTRIBUTION_QUERY[get_storage_backend().dialect])
+
+                rows = cursor.fetchall()
+
+            distribution: dict[str, dict[str, int]] = {}
+            for question_id, answer, count in rows:
+                answer_counts = distribution.setdefault(question_id, {})
+                if answer:
+                    answer_counts[answer] = count
+
+            return distribution
+        except Exception as e:
+            print(f"Error getting answer distribution: {e}")
+            return {}
@@ -1,12 +1,12 @@
 """
 UI components for link management in the Streamlit application.
 """
-import json
 import streamlit as st
 from typing import Optional
 
 from modules.feedback.feedback_service import FeedbackService
 from modules.auth.auth_service import AuthService, User
+from utils.downloads import get_download, prepare_download
 
 
 class FeedbackUI:
@@ -25,19 +25,43 @@ class FeedbackUI:
         self.feedback_service = feedback_service
         self.auth_service = auth_service
 
-    def get_feedback_json(self):
-        users = self.auth_service.get_all_user()
-        data = {}
+    def render_answer_distribution(self) -> None:
+        """Render how many users gave each answer, for admins."""
+        distribution = self.feedback_service.get_answer_distribution()
 
-        for user in users:
-            data[user.email] = {}
-            feedback = self.feedback_service.get_user_answer(user.user_id)
-            for a in feedback.answers:
-                data[user.email][a.question.question] = {}
-                data[user.email][a.question.question]['answer'] = a.answer
-                data[user.email][a.question.question]['comment'] = a.comment
+        with st.expander("Answer distribution"):
+            for question in self.feedback_service.get_all_questions():
+                counts = distribution.get(question.id, {})
+                st.write(f"**{question.question}**")
+                st.bar_chart({"users": {answer: counts.get(answer, 0) for answer in question.answers}})
+
+    def render_feedback_export(self) -> None:
+        """
+        Render the export of all feedback for admins.
 
-        return json.dumps(data, indent=4)
+        The export is only built when asked for, and is written to a temporary file
+        instead of being kept in memory. Preparing a new export deletes the previous one.
+        """
+        fmt = st.radio("Export format", ["JSON", "CSV"], horizontal=True, key="feedback-export-format")
+        download_key = f"feedback_export_{fmt.lower()}"
+
+        if st.button("Prepare feedback export"):
+            try:
+                prepare_download(download_key, self.feedback_service.iter_feedback_export(fmt.lower()),
+                                 f".{fmt.lower()}")
+            except Exception as e:
+                print(f"Error exporting feedback: {e}")
+                st.error("Failed to export feedback.")
+
+        if export_path := get_download(download_key):
+            with open(export_path, "rb") as f:
+                st.download_button(
+                    f"Download all feedback as {fmt}",
+                    f,
+                    f"feedback.{fmt.lower()}",
+                    "application/json" if fmt == "JSON" else "text/csv",
+                    key='download-feedback'
+                )
 
     def render_feedback_form(self, current_user: Optional[User] = None, is_admin: bool = False) -> None:
         """
@@ -87,10 +111,5 @@ class FeedbackUI:
                         st.error(f"Failed to submit feedback.")
 
         if is_admin:
-            st.download_button(
-                "Export all feedback to JSON",
-                self.get_feedback_json(),
-                "feedback.json",
-                "application/json",
-                key='download-json'
-            )
+            self.render_answer_distribution()
+            self.render_feedback_export()
@@ -2,15 +2,18 @@
 File model for representing uploaded files in the application.
 """
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Dict, Any
+from datetime import datetime, timezone
+from typing import Any, ClassVar, Dict, NamedTuple, Union
 
 
-@dataclass
+@dataclass(slots=True)
 class FileModel:
     """
     Model representing an uploaded file.
     """
+    # Columns of the files table read by from_row, in order
+    COLUMNS: ClassVar[str] = "file_id, user_id, name, path, size, type, uploaded_at"
+
     id: str
     name: str
     path: str
@@ -19,6 +22,23 @@ class FileModel:
     uploaded_at: str
     user_id: str  # Added user_id to associate files with users
 
+    def __post_init__(self):
+        """Format timestamps read from the database like the ones created by the app."""
+        if isinstance(self.uploaded_at, datetime):
+            self.uploaded_at = self.uploaded_at.strftime("%Y-%m-%d %H:%M:%S")
+
+    @classmethod
+    def from_row(cls, file_id: str, user_id: str, name: str, path: str, size: int, type: str,
+                 uploaded_at: datetime) -> 'FileModel':
+        """
+        Create a FileModel instance from a row of COLUMNS.
+
+        Returns:
+            FileModel: Instance of FileModel, with the path relative to the upload dir
+        """
+        return cls(id=file_id, name=name, path=path, size=size, type=type, uploaded_at=uploaded_at,
+                   user_id=user_id)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'FileModel':
         """
@@ -36,7 +56,7 @@ class FileModel:
             path=data.get('path', ''),
             size=data.get('size', 0),
             type=data.get('type', ''),
-            uploaded_at=data.get('uploaded_at', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            uploaded_at=data.get('uploaded_at', datetime.now(timezone.utc)),
             user_id=data.get('user_id', '')
         )
 
@@ -79,3 +99,20 @@ class FileModel:
 
     def __str__(self) -> str:
         return f"{self.name} ({self.size_in_kb:.2f} KB, {self.uploaded_at})"
+
+
+class FileUpload(NamedTuple):
+    """A file of a bulk upload."""
+    content: Union[bytes, bytearray, memoryview]
+    name: str
+    type: str = ""
+
+
+class BulkUploadResult(NamedTuple):
+    """Outcome of a bulk upload, by file name."""
+    uploaded: list[FileModel]
+    # Names that replaced an existing file, also in uploaded
+    replaced: list[str]
+    # Names that already existed and were left as they were
+    skipped: list[str]
+    failed: list[str]
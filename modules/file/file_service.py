@@ -3,14 +3,16 @@ Service for managing file operations in the application.
 """
 import os
 import pathlib
-import streamlit as st
 import uuid
-from typing import List, Optional, BinaryIO, Union
-from datetime import datetime
-
-from modules.file.file_model import FileModel
-from config.config import UPLOAD_DIR
-from utils.db_conneciton import db_conneciton, get_supabase_client
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Union
+from datetime import datetime, timezone
+
+from modules.file.file_model import BulkUploadResult, FileModel, FileUpload
+from config.config import FILE_LIST_BATCH_SIZE, FILE_UPLOAD_MAX_WORKERS, UPLOAD_DIR
+from utils.db_conneciton import db_conneciton
+from utils.object_store import get_object_store
+from utils.query import fetch_all, fetch_one
 from modules.file.file_utils import delete_file
 
 
@@ -24,28 +26,7 @@ class FileService:
         # Create necessary directories
         os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-        self._initialize_db()
-
-        supabase = get_supabase_client()
-        self.bucket = supabase.storage.from_(st.secrets.bucket["BUCKET_NAME"])
-
-    def _initialize_db(self) -> None:
-        """Initialize the database tables for file storage."""
-        with db_conneciton() as cursor:
-            # Create files table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS files (
-                file_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                path TEXT NOT NULL,
-                size INTEGER NOT NULL,
-                type TEXT,
-                uploaded_at TIMESTAMP NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            ''')
-            cursor.execute('ALTER TABLE files ENABLE ROW LEVEL SECURITY;')
+        self.object_store = get_object_store()
 
     def add_file(self, file: Union[BinaryIO, bytes, bytearray, memoryview],
                  filename: str, file_type: str = "", user_id: str = "") -> Optional[FileModel]:
@@ -87,18 +68,13 @@ class FileService:
 
                 f.write(content)
 
-            self.bucket.upload(
-                file=pathlib.Path(file_path),
-                path=file_relative_path,
-                file_options={"cache-control": "86400",
-                              "upsert": "false"}  # 86400 is 1 day
-            )
+            self.object_store.upload(file_path, file_relative_path)
 
             # Get file size
             file_size = os.path.getsize(file_path)
 
             # Current timestamp
-            uploaded_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            uploaded_at = datetime.now(timezone.utc)
 
             # Create file model
             file_model = FileModel(
@@ -130,6 +106,142 @@ class FileService:
             print(f"Error adding file: {e}")
             return None
 
+    def get_user_file_index(self, user_id: str) -> dict[str, list[FileModel]]:
+        """
+        Get the files of a user by name, without syncing them with the bucket.
+
+        Args:
+            user_id: ID of the user
+
+        Returns:
+            dict: File name mapped to the files with that name, newest first, their paths relative to the upload dir
+        """
+        index: dict[str, list[FileModel]] = {}
+        for file in fetch_all(
+                f"SELECT {FileModel.COLUMNS} FROM files WHERE user_id = %s ORDER BY uploaded_at DESC",
+                (user_id,), FileModel.from_row):
+            index.setdefault(file.name, []).append(file)
+        return index
+
+    def add_files(self, uploads: list[FileUpload], user_id: str, replace_existing: bool = False) -> BulkUploadResult:
+        """
+        Add several files with one duplicate check and one insert.
+
+        The files are sent to the bucket concurrently. A file replacing an existing one with the
+        same name only deletes it once the new file is stored.
+
+        Args:
+            uploads: The files
+            user_id: ID of the user who owns the files
+            replace_existing: Replace the existing files with the same name instead of skipping the upload
+
+        Returns:
+            BulkUploadResult: The uploaded, replaced, skipped and failed files
+        """
+        result = BulkUploadResult(uploaded=[], replaced=[], skipped=[], failed=[])
+
+        try:
+            existing = self.get_user_file_index(user_id)
+        except Exception as e:
+            print(f"Error getting user files: {e}")
+            result.failed.extend(upload.name for upload in uploads)
+            return result
+
+        # Write the new files locally, skipping duplicates
+        user_upload_dir = os.path.join(UPLOAD_DIR, user_id) if user_id else UPLOAD_DIR
+        os.makedirs(user_upload_dir, exist_ok=True)
+        uploaded_at = datetime.now(timezone.utc)
+
+        pending: list[tuple[FileModel, str]] = []
+        names = set()
+        for upload in uploads:
+            if upload.name in names or (upload.name in existing and not replace_existing):
+                result.skipped.append(upload.name)
+                continue
+            names.add(upload.name)
+
+            file_id = str(uuid.uuid4())
+            file_name = f"{file_id}_{upload.name}"
+            file_path = os.path.join(user_upload_dir, file_name)
+            try:
+                with open(file_path, "wb") as f:
+                    f.write(upload.content)
+            except Exception as e:
+                print(f"Error saving file {upload.name}: {e}")
+                result.failed.append(upload.name)
+                continue
+
+            pending.append((FileModel(id=file_id, name=upload.name, path=file_path, size=os.path.getsize(file_path),
+                                      type=upload.type, uploaded_at=uploaded_at, user_id=user_id),
+                            f"{user_id}/{file_name}"))
+
+        if not pending:
+            return result
+
+        # Send them to the bucket concurrently
+        stored: list[tuple[FileModel, str]] = []
+        with ThreadPoolExecutor(max_workers=min(FILE_UPLOAD_MAX_WORKERS, len(pending)),
+                                thread_name_prefix="file-upload") as executor:
+            futures = [(executor.submit(self.object_store.upload, file.path, key), file, key)
+                       for file, key in pending]
+            for future, file, key in futures:
+                try:
+                    future.result()
+                    stored.append((file, key))
+                except Exception as e:
+                    print(f"Error uploading file {file.name}: {e}")
+                    delete_file(file.path)
+                    result.failed.append(file.name)
+
+        if not stored:
+            return result
+
+        # Save all the metadata in a single statement
+        try:
+            with db_conneciton() as cursor:
+                cursor.execute(
+                    "INSERT INTO files (file_id, user_id, name, path, size, type, uploaded_at) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(stored)),
+                    [value for file, key in stored
+                     for value in (file.id, user_id, file.name, key, file.size, file.type, uploaded_at)]
+                )
+        except Exception as e:
+            print(f"Error adding files: {e}")
+            self.object_store.remove([key for _, key in stored])
+            for file, _ in stored:
+                delete_file(file.path)
+            result.failed.extend(file.name for file, _ in stored)
+            return result
+
+        result.uploaded.extend(file for file, _ in stored)
+
+        replaced = [file for stored_file, _ in stored for file in existing.get(stored_file.name, [])]
+        if replaced:
+            self._delete_stored_files(replaced)
+            result.replaced.extend(dict.fromkeys(file.name for file in replaced))
+
+        return result
+
+    def _delete_stored_files(self, files: list[FileModel]) -> None:
+        """
+        Delete files from the disk, the bucket and the database, in one call to each.
+
+        Args:
+            files: The files, their paths relative to the upload dir
+        """
+        try:
+            for file in files:
+                delete_file(os.path.join(UPLOAD_DIR, file.path))
+
+            self.object_store.remove([file.path for file in files])
+
+            with db_conneciton() as cursor:
+                cursor.execute(
+                    f"DELETE FROM files WHERE file_id IN ({', '.join(['%s'] * len(files))})",
+                    [file.id for file in files])
+        except Exception as e:
+            print(f"Error deleting files: {e}")
+
     def _relative_from_absolute_path(self, file_path: str) -> str:
         """
         takes the absolute path of the file, returns the file name with the parent directory
@@ -163,7 +275,7 @@ class FileService:
             UPLOAD_DIR, file_path.split('/')[0]), exist_ok=True)
 
         with open(absolute_path, "wb+") as f:
-            f.write(self.bucket.download(file_path))
+            f.write(self.object_store.download(file_path))
 
         return absolute_path
 
@@ -178,37 +290,41 @@ class FileService:
             Optional[FileModel]: The file model or None if not found
         """
         try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT file_id, user_id, name, path, size, type, uploaded_at
-                    FROM files
-                    WHERE file_id = %s
-                    """,
-                    (file_id,)
-                )
-                row = cursor.fetchone()
-
-            if row:
-                file_id, user_id, name, path, size, type, uploaded_at = row
-
-                file_path = self._sync_file_with_bucket(path)
+            file = fetch_one(
+                f"SELECT {FileModel.COLUMNS} FROM files WHERE file_id = %s", (file_id,), FileModel.from_row)
 
-                return FileModel(
-                    id=file_id,
-                    name=name,
-                    path=file_path,
-                    size=size,
-                    type=type,
-                    uploaded_at=uploaded_at,
-                    user_id=user_id
-                )
+            if file:
+                file.path = self._sync_file_with_bucket(file.path)
 
-            return None
+            return file
         except Exception as e:
             print(f"Error getting file: {e}")
             return None
 
+    def _available_files(self, files: Iterable[FileModel]) -> Iterator[FileModel]:
+        """
+        Sync files with the bucket, skipping the ones that no longer exist.
+
+        Args:
+            files: Files with their paths relative to the upload dir
+
+        Returns:
+            Iterator[FileModel]: The files with their local absolute paths
+        """
+        missing = []
+        for file in files:
+            file.path = self._sync_file_with_bucket(file.path)
+
+            # Check if file exists on disk
+            if os.path.exists(file.path):
+                yield file
+            else:
+                missing.append(file.id)
+
+        # File doesn't exist on disk, delete from database
+        for file_id in missing:
+            self.delete_file(file_id)
+
     def get_user_files(self, user_id: str) -> List[FileModel]:
         """
         Get all files for a specific user.
@@ -220,45 +336,44 @@ class FileService:
             List[FileModel]: List of file models
         """
         try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT file_id, user_id, name, path, size, type, uploaded_at
-                    FROM files
-                    WHERE user_id = %s
-                    ORDER BY uploaded_at DESC
-                    """,
-                    (user_id,)
-                )
+            files = fetch_all(
+                f"SELECT {FileModel.COLUMNS} FROM files WHERE user_id = %s ORDER BY uploaded_at DESC",
+                (user_id,), FileModel.from_row)
 
-                rows = cursor.fetchall()
-
-            files = []
-            for row in rows:
-                file_id, user_id, name, path, size, type, uploaded_at = row
-
-                file_path = self._sync_file_with_bucket(path)
-
-                # Check if file exists on disk
-                if os.path.exists(file_path):
-                    files.append(FileModel(
-                        id=file_id,
-                        name=name,
-                        path=file_path,
-                        size=size,
-                        type=type,
-                        uploaded_at=uploaded_at,
-                        user_id=user_id
-                    ))
-                else:
-                    # File doesn't exist on disk, delete from database
-                    self.delete_file(file_id)
-
-            return files
+            return list(self._available_files(files))
         except Exception as e:
             print(f"Error getting user files: {e}")
             return []
 
+    def iter_all_files(self) -> Iterator[FileModel]:
+        """
+        Iterate over all files, fetching them from the database in batches.
+
+        Each batch is read by keyset in its own short transaction and only synced with the
+        bucket once its connection is back in the pool, so a long listing holds no connection.
+
+        Returns:
+            Iterator[FileModel]: The file models, newest first
+        """
+        after: Optional[tuple] = None
+        while True:
+            query = f"SELECT {FileModel.COLUMNS} FROM files"
+            params = []
+            if after is not None:
+                query += " WHERE (uploaded_at, file_id) < (%s, %s)"
+                params.extend(after)
+            query += " ORDER BY uploaded_at DESC, file_id DESC LIMIT %s"
+            params.append(FILE_LIST_BATCH_SIZE)
+
+            # Raw rows, the models format uploaded_at for display
+            rows = fetch_all(query, params, lambda *row: row)
+            yield from self._available_files([FileModel.from_row(*row) for row in rows])
+
+            if len(rows) < FILE_LIST_BATCH_SIZE:
+                return
+            file_id, *_, uploaded_at = rows[-1]
+            after = (uploaded_at, file_id)
+
     def get_all_files(self) -> List[FileModel]:
         """
         Get all files.
@@ -267,39 +382,7 @@ class FileService:
             List[FileModel]: List of all file models
         """
         try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT file_id, user_id, name, path, size, type, uploaded_at
-                    FROM files
-                    ORDER BY uploaded_at DESC
-                    """
-                )
-
-                rows = cursor.fetchall()
-
-            files = []
-            for row in rows:
-                file_id, user_id, name, path, size, type, uploaded_at = row
-
-                file_path = self._sync_file_with_bucket(path)
-
-                # Check if file exists on disk
-                if os.path.exists(file_path):
-                    files.append(FileModel(
-                        id=file_id,
-                        name=name,
-                        path=file_path,
-                        size=size,
-                        type=type,
-                        uploaded_at=uploaded_at,
-                        user_id=user_id
-                    ))
-                else:
-                    # File doesn't exist on disk, delete from database
-                    self.delete_file(file_id)
-
-            return files
+            return list(self.iter_all_files())
         except Exception as e:
             print(f"Error getting all files: {e}")
             return []
@@ -326,7 +409,7 @@ class FileService:
                 delete_file(file.path)
 
             # Delete from bucket
-            self.bucket.remove([self._relative_from_absolute_path(file.path)])
+            self.object_store.remove([self._relative_from_absolute_path(file.path)])
 
             # Delete from database
             with db_conneciton() as cursor:
@@ -358,7 +441,7 @@ class FileService:
                 if os.path.exists(file.path):
                     delete_file(file.path)
                 # Delete from bucket
-                self.bucket.remove(
+                self.object_store.remove(
                     [self._relative_from_absolute_path(file.path)])
 
             # Delete from database
@@ -6,7 +6,7 @@ import pandas as pd
 from typing import List, Optional
 
 from modules.file.file_service import FileService
-from modules.file.file_model import FileModel
+from modules.file.file_model import FileModel, FileUpload
 from modules.auth.auth_service import User
 
 
@@ -24,6 +24,35 @@ class FileUI:
         """
         self.file_service = file_service
 
+    def upload_files(self, uploaded_files: list, current_user: User, replace_existing: bool) -> bool:
+        """
+        Upload the files picked in a file uploader and report the outcome of each.
+
+        Args:
+            uploaded_files: Files returned by st.file_uploader
+            current_user: Currently authenticated user
+            replace_existing: Replace the existing files with the same name
+
+        Returns:
+            bool: True if any file was uploaded
+        """
+        result = self.file_service.add_files(
+            [FileUpload(content=f.getbuffer(), name=f.name, type=f.type) for f in uploaded_files],
+            current_user.user_id,
+            replace_existing=replace_existing
+        )
+
+        for name in result.skipped:
+            st.warning(f"File '{name}' already exists. Select 'Replace existing files' option to overwrite.")
+        for name in result.replaced:
+            st.info(f"Replaced existing file: {name}")
+        for file in result.uploaded:
+            st.success(f"Uploaded: {file.name}")
+        for name in result.failed:
+            st.error(f"Failed to upload: {name}")
+
+        return bool(result.uploaded)
+
     def render_upload_section(self, current_user: Optional[User] = None) -> None:
         """
         Render the file upload section.
@@ -43,40 +72,8 @@ class FileUI:
         replace_existing = st.checkbox("Replace existing files with the same name", value=False)
 
         if uploaded_files:
-            # Track if any files were successfully uploaded
-            files_uploaded = False
-
-            # Process each uploaded file
-            for uploaded_file in uploaded_files:
-                # Get existing files to check for duplicates
-                existing_files = self.file_service.get_user_files(current_user.user_id)
-                duplicate = any(f.name == uploaded_file.name for f in existing_files)
-
-                # Handle duplicates based on user preference
-                if duplicate and not replace_existing:
-                    st.warning(f"File '{uploaded_file.name}' already exists. Select 'Replace existing files' option to overwrite.")
-                    continue
-                elif duplicate and replace_existing:
-                    # Delete existing file with the same name
-                    for existing_file in existing_files:
-                        if existing_file.name == uploaded_file.name:
-                            self.file_service.delete_file(existing_file.id)
-                            st.info(f"Replacing existing file: {uploaded_file.name}")
-                            break
-
-                # Add file to service
-                file_model = self.file_service.add_file(
-                    file=uploaded_file.getbuffer(),  # This returns a memoryview
-                    filename=uploaded_file.name,
-                    file_type=uploaded_file.type,
-                    user_id=current_user.user_id
-                )
-
-                if file_model:
-                    st.success(f"Uploaded: {uploaded_file.name}")
-                    files_uploaded = True
-                else:
-                    st.error(f"Failed to upload: {uploaded_file.name}")
+            # Check duplicates and store all the files at once
+            files_uploaded = self.upload_files(uploaded_files, current_user, replace_existing)
 
             # Only rerun once all files are processed
             if files_uploaded:
@@ -0,0 +1,53 @@
+"""
+History model for representing answered questions in the application.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, ClassVar, Dict
+
+
+@dataclass(slots=True)
+class HistoryModel:
+    """
+    Model representing a question answered by one of the AI tabs.
+    """
+    # Columns of the history table read by from_row, in order
+    COLUMNS: ClassVar[str] = "history_id, user_id, mode, question, answer, events, created_at"
+
+    id: int
+    user_id: str
+    mode: str
+    question: str
+    answer: str
+    events: list[str]
+    created_at: str
+
+    def __post_init__(self):
+        """Format timestamps read from the database like the ones created by the app."""
+        if isinstance(self.created_at, datetime):
+            self.created_at = self.created_at.strftime("%Y-%m-%d %H:%M:%S")
+
+    @classmethod
+    def from_row(cls, history_id: int, user_id: str, mode: str, question: str, answer: str, events: list[str],
+                 created_at: datetime) -> 'HistoryModel':
+        """
+        Create a HistoryModel instance from a row of COLUMNS.
+
+        Returns:
+            HistoryModel: Instance of HistoryModel
+        """
+        return cls(id=history_id, user_id=user_id, mode=mode, question=question, answer=answer, events=events,
+                   created_at=created_at)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert a HistoryModel instance to the result of the query it stores.
+
+        Returns:
+            Dict: question, answer and events
+        """
+        return {
+            'question': self.question,
+            'answer': self.answer,
+            'events': self.events
+        }
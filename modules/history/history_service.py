@@ -0,0 +1,122 @@
+"""
+Service for managing the query history in the application.
+"""
+import json
+from typing import Iterator, Optional
+
+from config.config import HISTORY_PAGE_SIZE
+from modules.history.history_model import HistoryModel
+from utils.db_conneciton import db_conneciton
+from utils.query import fetch_all, iter_rows
+
+MODE_CONVENTIONAL = "conventional"
+MODE_LANGGRAPH = "langgraph"
+
+
+class HistoryService:
+    """
+    Service for managing the questions answered by the AI tabs.
+    """
+
+    def add_entry(self, user_id: str, mode: str, result: dict) -> Optional[HistoryModel]:
+        """
+        Store an answered question.
+
+        Args:
+            user_id: ID of the user who asked
+            mode: MODE_CONVENTIONAL or MODE_LANGGRAPH
+            result: The result of the query, with its question, answer and events
+
+        Returns:
+            Optional[HistoryModel]: The stored entry or None if failed
+        """
+        try:
+            with db_conneciton() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO history (user_id, mode, question, answer, events, created_at)
+                    VALUES (%s, %s, %s, %s, %s, now())
+                    RETURNING {HistoryModel.COLUMNS}
+                    """,
+                    (user_id, mode, result["question"], result["answer"], json.dumps(result["events"]))
+                )
+                row = cursor.fetchone()
+
+            return HistoryModel.from_row(*row)
+        except Exception as e:
+            print(f"Error adding history entry: {e}")
+            return None
+
+    def get_page(self, user_id: str, mode: str, before_id: Optional[int] = None,
+                 limit: int = HISTORY_PAGE_SIZE) -> list[HistoryModel]:
+        """
+        Get a page of the history, newest first.
+
+        Pages are read by keyset, so reading an old page costs the same as reading the latest.
+
+        Args:
+            user_id: ID of the user
+            mode: MODE_CONVENTIONAL or MODE_LANGGRAPH
+            before_id: Only entries older than this one, the latest entries if not provided
+            limit: Max number of entries
+
+        Returns:
+            list[HistoryModel]: The entries
+        """
+        query = f"SELECT {HistoryModel.COLUMNS} FROM history WHERE user_id = %s AND mode = %s"
+        params = [user_id, mode]
+        if before_id is not None:
+            query += " AND history_id < %s"
+            params.append(before_id)
+        query += " ORDER BY history_id DESC LIMIT %s"
+        params.append(limit)
+
+        try:
+            return fetch_all(query, params, HistoryModel.from_row)
+        except Exception as e:
+            print(f"Error getting history: {e}")
+            return []
+
+    def iter_export(self, user_id: str, mode: str) -> Iterator[str]:
+        """
+        Export the whole history of a user as JSON, oldest first.
+
+        Entries are fetched in batches and written out as they arrive.
+
+        Args:
+            user_id: ID of the user
+            mode: MODE_CONVENTIONAL or MODE_LANGGRAPH
+
+        Returns:
+            Iterator[str]: Chunks of a JSON list of {question, answer, events}
+        """
+        entries = iter_rows(
+            f"SELECT {HistoryModel.COLUMNS} FROM history WHERE user_id = %s AND mode = %s ORDER BY history_id",
+            (user_id, mode), HistoryModel.from_row, name="history_export")
+
+        separator = ""
+        yield "["
+        for entry in entries:
+            yield separator + "\n    " + json.dumps(entry.to_dict(), indent=4).replace("\n", "\n    ")
+            separator = ","
+        yield "\n]" if separator else "]"
+
+    def clear(self, user_id: str, mode: str) -> bool:
+        """
+        Delete the history of a user.
+
+        Args:
+            user_id: ID of the user
+            mode: MODE_CONVENTIONAL or MODE_LANGGRAPH
+
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        try:
+            with db_conneciton() as cursor:
+                cursor.execute("DELETE FROM history WHERE user_id = %s AND mode = %s", (user_id, mode))
+
+            return True
+        except Exception as e:
+            print(f"Error clearing history: {e}")
+            return False
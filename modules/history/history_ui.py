@@ -0,0 +1,141 @@
+"""
+UI components for the query history in the Streamlit application.
+"""
+from collections import deque
+from typing import Callable, Optional
+
+import streamlit as st
+
+from config.config import HISTORY_PAGE_SIZE
+from modules.auth.auth_service import User
+from modules.history.history_model import HistoryModel
+from modules.history.history_service import HistoryService
+from utils.downloads import discard_download, get_download, prepare_download
+
+
+class HistoryUI:
+    """
+    UI components for the history of an AI tab.
+
+    Only the latest page of the history is kept in the session. Older pages are read
+    from the database when the user pages back to them.
+    """
+
+    def __init__(self, history_service: HistoryService, mode: str):
+        """
+        Initialize the HistoryUI.
+
+        Args:
+            history_service: HistoryService instance
+            mode: MODE_CONVENTIONAL or MODE_LANGGRAPH, the tab whose history is shown
+        """
+        self.history_service = history_service
+        self.mode = mode
+
+    def _key(self, name: str, current_user: User) -> str:
+        return f"{self.mode}_history_{name}_{current_user.user_id}"
+
+    def _get_page(self, current_user: User, before_id: Optional[int] = None) -> tuple[list[HistoryModel], bool]:
+        """A page of the history, oldest first, and whether there are older entries."""
+        entries = self.history_service.get_page(current_user.user_id, self.mode, before_id=before_id,
+                                                limit=HISTORY_PAGE_SIZE + 1)
+        return list(reversed(entries[:HISTORY_PAGE_SIZE])), len(entries) > HISTORY_PAGE_SIZE
+
+    def _latest(self, current_user: User) -> deque[HistoryModel]:
+        """Latest entries of the history, oldest first, loaded once per session."""
+        key = self._key("latest", current_user)
+        if key not in st.session_state:
+            entries, has_older = self._get_page(current_user)
+            st.session_state[key] = deque(entries, maxlen=HISTORY_PAGE_SIZE)
+            st.session_state[self._key("latest_has_older", current_user)] = has_older
+        return st.session_state[key]
+
+    def _page_starts(self, current_user: User) -> list[int]:
+        """Ids the older pages shown start before, empty on the latest page."""
+        return st.session_state.setdefault(self._key("pages", current_user), [])
+
+    def add(self, current_user: User, result: dict) -> None:
+        """
+        Store the result of a query and go back to the latest page.
+
+        Args:
+            current_user: Currently authenticated user
+            result: The result of the query
+        """
+        entry = self.history_service.add_entry(current_user.user_id, self.mode, result)
+        if entry:
+            latest = self._latest(current_user)
+            if len(latest) == latest.maxlen:
+                # The oldest entry of the page moves to the older ones
+                st.session_state[self._key("latest_has_older", current_user)] = True
+            latest.append(entry)
+        self._page_starts(current_user).clear()
+
+    def render_history(self, current_user: User, display_result: Callable[[dict], None]) -> None:
+        """
+        Render the visible page of the history.
+
+        Args:
+            current_user: Currently authenticated user
+            display_result: Renders an entry given as {question, answer, events}
+        """
+        page_starts = self._page_starts(current_user)
+        latest = self._latest(current_user)
+
+        if page_starts:
+            entries, has_older = self._get_page(current_user, before_id=page_starts[-1])
+        else:
+            entries = list(latest)
+            has_older = st.session_state.get(self._key("latest_has_older", current_user), False)
+
+        older, newer = st.columns(2)
+        if page_starts and newer.button("Newer questions", key=self._key("newer", current_user)):
+            page_starts.pop()
+            st.rerun()
+        if entries and has_older and older.button("Older questions", key=self._key("older", current_user)):
+            page_starts.append(entries[0].id)
+            st.rerun()
+
+        for entry in entries:
+            display_result(entry.to_dict())
+
+    def render_actions(self, current_user: User) -> None:
+        """
+        Render the download and clear buttons of the history.
+
+        The download is only built when asked for, and streamed from the database to a
+        temporary file instead of being kept in memory. The file is replaced by the next
+        download and deleted with the history.
+
+        Args:
+            current_user: Currently authenticated user
+        """
+        if not self._latest(current_user):
+            return
+
+        download_key = self._key("download", current_user)
+        if st.button("Prepare History Download", key=self._key("prepare", current_user)):
+            try:
+                prepare_download(download_key, self.history_service.iter_export(current_user.user_id, self.mode),
+                                 ".json")
+            except Exception as e:
+                print(f"Error exporting history: {e}")
+                st.error("Failed to export the history.")
+
+        if download_path := get_download(download_key):
+            with open(download_path, "rb") as f:
+                st.download_button(
+                    label="Download History",
+                    key=f"{self.mode}_chat_history_download",
+                    data=f,
+                    file_name=f"{self.mode}_chat_history.json",
+                    mime="application/json",
+                )
+
+        if st.button("Clear History", key=self._key("clear", current_user)):
+            self.history_service.clear(current_user.user_id, self.mode)
+            self._latest(current_user).clear()
+            st.session_state[self._key("latest_has_older", current_user)] = False
+            self._page_starts(current_user).clear()
+            discard_download(download_key)
+            st.rerun()
@@ -2,15 +2,18 @@
 Link model for representing external links in the application.
 """
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import Any, ClassVar, Dict, Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class LinkModel:
     """
     Model representing an external link.
     """
+    # Columns of the links table read by from_row, in order
+    COLUMNS: ClassVar[str] = "link_id, user_id, url, description, added_at"
+
     id: str
     url: str
     user_id: str  # Added user_id to associate links with users
@@ -20,10 +23,24 @@ class LinkModel:
     def __post_init__(self):
         """Initialize default values if not provided."""
         if self.added_at is None:
-            self.added_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.added_at = datetime.now(timezone.utc)
+        if isinstance(self.added_at, datetime):
+            # Read from the database or just created
+            self.added_at = self.added_at.strftime("%Y-%m-%d %H:%M:%S")
         if self.description is None:
             self.description = ""
 
+    @classmethod
+    def from_row(cls, link_id: str, user_id: str, url: str, description: Optional[str],
+                 added_at: datetime) -> 'LinkModel':
+        """
+        Create a LinkModel instance from a row of COLUMNS.
+
+        Returns:
+            LinkModel: Instance of LinkModel
+        """
+        return cls(id=link_id, url=url, description=description, added_at=added_at, user_id=user_id)
+
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'LinkModel':
         """
@@ -39,7 +56,7 @@ class LinkModel:
             id=data.get('id', ''),
             url=data.get('url', ''),
             description=data.get('description', ''),
-            added_at=data.get('added_at', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            added_at=data.get('added_at'),
             user_id=data.get('user_id', '')
         )
 
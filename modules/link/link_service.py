@@ -2,11 +2,12 @@
 Service for managing link operations in the application.
 """
 import uuid
-from typing import List, Optional
-from datetime import datetime
+from typing import Iterator, List, Optional
+from datetime import datetime, timezone
 
 from modules.link.link_model import LinkModel
 from utils.db_conneciton import db_conneciton
+from utils.query import fetch_all, fetch_one, iter_rows
 
 
 class LinkService:
@@ -14,26 +15,6 @@ class LinkService:
     Service for managing link operations.
     """
 
-    def __init__(self):
-        """Initialize the LinkService."""
-        self._initialize_db()
-
-    def _initialize_db(self) -> None:
-        """Initialize the database tables for link storage."""
-        with db_conneciton() as cursor:
-            # Create links table
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS links (
-                link_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                url TEXT NOT NULL,
-                description TEXT,
-                added_at TIMESTAMP NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-            ''')
-            cursor.execute('ALTER TABLE links ENABLE ROW LEVEL SECURITY;')
-
     def add_link(self, url: str, description: str = "", user_id: str = "") -> Optional[LinkModel]:
         """
         Add a new link to the system.
@@ -49,7 +30,7 @@ class LinkService:
         try:
             # Create a new link model
             link_id = str(uuid.uuid4())
-            added_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            added_at = datetime.now(timezone.utc)
 
             link_model = LinkModel(
                 id=link_id,
@@ -90,29 +71,8 @@ class LinkService:
             Optional[LinkModel]: The link model or None if not found
         """
         try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT link_id, user_id, url, description, added_at
-                    FROM links
-                    WHERE link_id = %s
-                    """,
-                    (link_id,)
-                )
-                row = cursor.fetchone()
-
-            if row:
-                link_id, user_id, url, description, added_at = row
-
-                return LinkModel(
-                    id=link_id,
-                    url=url,
-                    description=description,
-                    added_at=added_at,
-                    user_id=user_id
-                )
-
-            return None
+            return fetch_one(
+                f"SELECT {LinkModel.COLUMNS} FROM links WHERE link_id = %s", (link_id,), LinkModel.from_row)
         except Exception as e:
             print(f"Error getting link: {e}")
             return None
@@ -128,36 +88,23 @@ class LinkService:
             List[LinkModel]: List of link models
         """
         try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT link_id, user_id, url, description, added_at
-                    FROM links
-                    WHERE user_id = %s
-                    ORDER BY added_at DESC
-                    """,
-                    (user_id,)
-                )
-
-                rows = cursor.fetchall()
-
-            links = []
-            for row in rows:
-                link_id, user_id, url, description, added_at = row
-
-                links.append(LinkModel(
-                    id=link_id,
-                    url=url,
-                    description=description,
-                    added_at=added_at,
-                    user_id=user_id
-                ))
-
-            return links
+            return fetch_all(
+                f"SELECT {LinkModel.COLUMNS} FROM links WHERE user_id = %s ORDER BY added_at DESC",
+                (user_id,), LinkModel.from_row)
         except Exception as e:
             print(f"Error getting user links: {e}")
             return []
 
+    def iter_all_links(self) -> Iterator[LinkModel]:
+        """
+        Iterate over all links, fetching them from the database in batches.
+
+        Returns:
+            Iterator[LinkModel]: The link models, newest first
+        """
+        return iter_rows(f"SELECT {LinkModel.COLUMNS} FROM links ORDER BY added_at DESC", (),
+                         LinkModel.from_row, name="all_links")
+
     def get_all_links(self) -> List[LinkModel]:
         """
         Get all links.
@@ -166,30 +113,7 @@ class LinkService:
             List[LinkModel]: List of all link models
         """
         try:
-            with db_conneciton() as cursor:
-                cursor.execute(
-                    """
-                    SELECT link_id, user_id, url, description, added_at
-                    FROM links
-                    ORDER BY added_at DESC
-                    """
-                )
-
-                rows = cursor.fetchall()
-
-            links = []
-            for row in rows:
-                link_id, user_id, url, description, added_at = row
-
-                links.append(LinkModel(
-                    id=link_id,
-                    url=url,
-                    description=description,
-                    added_at=added_at,
-                    user_id=user_id
-                ))
-
-            return links
+            return list(self.iter_all_links())
         except Exception as e:
             print(f"Error getting all links: {e}")
             return []
@@ -4,9 +4,13 @@ from typing import Dict, List, Any, Optional
 from modules.file.file_model import FileModel
 from modules.link.link_model import LinkModel
 from utils.ai_utils import get_ai_client, conventional_ai_retriever
+from utils.llm_scheduler import schedule_llm_call
+from utils.model_routing import STEP_CONVENTIONAL, classify_query, completion_kwargs, route
+from utils.tracing import record_usage, span, trace_run
 
 def run_conventional_query(query: str, files: Optional[List[FileModel]] = None,
-                        links: Optional[List[LinkModel]] = None) -> Dict[str, Any]:
+                        links: Optional[List[LinkModel]] = None,
+                        retriever_id: Optional[str] = None) -> Dict[str, Any]:
     """
     Process a query with the AI.
 
@@ -15,6 +19,7 @@ def run_conventional_query(query: str, files: Optional[List[FileModel]] = None,
         user_id: ID of the user making the query
         files: List of associated files
         links: List of associated links
+        retriever_id: ID of an existing index, used instead of files and links
 
     Returns:
         Dict: Result with thinking steps and response
@@ -22,29 +27,38 @@ def run_conventional_query(query: str, files: Optional[List[FileModel]] = None,
     thinking_steps = []
 
     openai_client = get_ai_client()
-    model = "gpt-4o"
+    complexity = classify_query(query)
+    model_route = route(STEP_CONVENTIONAL, complexity)
+    model = model_route.model
 
-    retrieved_documents = conventional_ai_retriever(query, files, links)
-    information = "\n\n".join(retrieved_documents)
+    with trace_run("conventional", question=query) as trace:
+        retrieved_documents = conventional_ai_retriever(query, files, links, retriever_id)
+        information = "\n\n".join(retrieved_documents)
 
-    messages = [
-        {
-            "role": "user",
-            "content": f"""Question: {query}
+        messages = [
+            {
+                "role": "user",
+                "content": f"""Question: {query}
 
 Information from document:
 {information}
 """
-        }
-    ]
-
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=0.2,  # Add some creativity while keeping responses focused
-        max_tokens=10000   # Adjust based on your needs
-    )
-    content = response.choices[0].message.content
+            }
+        ]
+
+        kwargs = completion_kwargs(model_route)
+        if not model_route.reasoning_effort:
+            kwargs["temperature"] = 0.2  # Add some creativity while keeping responses focused
+
+        with span("llm.conventional", model=model, complexity=complexity) as current:
+            response = schedule_llm_call(model, lambda: openai_client.chat.completions.create(
+                messages=messages,
+                **kwargs
+            ), prompt=messages[0]["content"], max_completion_tokens=model_route.max_tokens)
+            record_usage(current, response)
+        content = response.choices[0].message.content
+
+    thinking_steps.append(trace.summary())
 
     return {
         "question": query,
@@ -1,8 +1,13 @@
 
 from utils.ai_utils import get_ai_client
+from utils.llm_scheduler import schedule_llm_call
+from utils.model_routing import STEP_AUGMENTATION, completion_kwargs, route
+from utils.tracing import record_usage, span
 
-def augment_multiple_query(query, model="gpt-3.5-turbo"):
+def augment_multiple_query(query, complexity=None):
     openai_client = get_ai_client()
+    model_route = route(STEP_AUGMENTATION, complexity)
+    model = model_route.model
     messages = [
         {
             "role": "system",
@@ -15,10 +20,12 @@ def augment_multiple_query(query, model="gpt-3.5-turbo"):
         {"role": "user", "content": query}
     ]
 
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=messages,
-    )
+    with span("llm.augment_query", model=model) as current:
+        response = schedule_llm_call(model, lambda: openai_client.chat.completions.create(
+            messages=messages,
+            **completion_kwargs(model_route),
+        ), prompt=messages[0]["content"] + query, max_completion_tokens=model_route.max_tokens)
+        record_usage(current, response)
     content = response.choices[0].message.content
     content = content.split("\n")
     return content
@@ -0,0 +1,69 @@
+"""
+Tests of the parsing of sectioned answers.
+"""
+from graph.answer_parsing import (FINAL_ANSWER_SECTION, PART_NUMBERS_SECTION, THOUGHT_PROCESS_SECTION,
+                                  extract_part_numbers, missing_sections, parse_sections)
+
+ANSWER = """**Thought Process:**
+- Part numbers for the bearing are listed in table 3.
+- The final answer depends on the brand name on the nameplate.
+
+**Final Answer:** Replace the bearing.
+
+**Brand name:** Atlas Copco
+
+### Part Numbers
+- Bearing: 6205-2RS
+"""
+
+
+def test_headers_with_decoration_are_found():
+    sections = parse_sections(ANSWER)
+
+    assert sections[FINAL_ANSWER_SECTION] == "Replace the bearing."
+    assert sections[PART_NUMBERS_SECTION] == "- Bearing: 6205-2RS"
+
+
+def test_prose_mentioning_a_section_is_not_a_header():
+    sections = parse_sections(ANSWER)
+
+    assert "table 3" in sections[THOUGHT_PROCESS_SECTION]
+    assert "nameplate" in sections[THOUGHT_PROCESS_SECTION]
+    assert missing_sections(ANSWER) == []
+
+
+def test_section_named_without_colon_or_content_is_missing():
+    answer = "Final answer depends on the part numbers of the pump."
+
+    assert parse_sections(answer) == {}
+
+
+def test_part_numbers_ignore_prose_mentioning_the_section():
+    assert extract_part_numbers(ANSWER) == [{"name": "Bearing", "number": "6205-2RS"}]
+
+
+def test_part_names_keep_their_brackets():
+    answer = """Part Numbers:
+- Air filter element (2 pcs): 1613-9001-00
+- Oil filter (P/N 2914-5077-00)
+- Bolt M8x1.25, part number 0147-1234
+"""
+
+    assert extract_part_numbers(answer) == [
+        {"name": "Air filter element (2 pcs)", "number": "1613-9001-00"},
+        {"name": "Oil filter", "number": "2914-5077-00"},
+        {"name": "Bolt M8x1.25", "number": "0147-1234"},
+    ]
+
+
+def test_oil_grades_and_measures_are_not_part_numbers():
+    answer = """Part Numbers:
+- Drive belt 1250mm: 1622-0655-00
+- Engine oil: 10W-40
+"""
+
+    # The oil has no part number, so the section cannot be read reliably
+    assert extract_part_numbers(answer) is None
+    assert extract_part_numbers(answer.replace("- Engine oil: 10W-40\n", "")) == [
+        {"name": "Drive belt 1250mm", "number": "1622-0655-00"},
+    ]
@@ -0,0 +1,3 @@
+"""
+Developer tools for load testing and benchmarking the AMA.
+"""
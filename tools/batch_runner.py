@@ -0,0 +1,227 @@
+"""
+Headless batch runner for the conventional and agent pipelines.
+
+Runs every question of a CSV file (a "question" column and an optional "id" column)
+against an existing index or a set of local files and links, and writes the answers,
+timings and token usage to CSV or JSONL:
+
+    python -m tools.batch_runner questions.csv --file manual.pdf --pipeline both \\
+        --concurrency 4 --rate-limit 0.5 --output answers.csv
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Optional
+
+from utils.rate_limit import TokenBucket
+
+OUTPUT_FIELDS = [
+    "id", "pipeline", "question", "answer", "error", "duration_seconds",
+    "prompt_tokens", "completion_tokens", "llm_calls", "reflection_exit_reason", "run_id",
+]
+
+
+def read_questions(path: str) -> list[dict[str, str]]:
+    """
+    Read the question file.
+
+    Args:
+        path: CSV file with a "question" column and an optional "id" column
+
+    Returns:
+        list[dict[str, str]]: Questions as {'id', 'question'} dicts
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    if rows and "question" not in rows[0]:
+        raise SystemExit(f"{path} has no 'question' column")
+
+    # Rows without a question cell have None for it, they are skipped like blank questions
+    return [{"id": row.get("id") or str(i + 1), "question": row["question"]}
+            for i, row in enumerate(rows) if (row["question"] or "").strip()]
+
+
+def local_sources(paths: Iterable[str], urls: Iterable[str]) -> tuple[list, list]:
+    """
+    Build file and link models for local files and URLs, with IDs stable across runs.
+
+    Args:
+        paths: Paths of local files
+        urls: URLs of web pages
+
+    Returns:
+        tuple[list[FileModel], list[LinkModel]]: The models
+    """
+    from modules.file.file_model import FileModel
+    from modules.link.link_model import LinkModel
+
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        file_id = hashlib.sha1(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime}".encode()).hexdigest()[:12]
+        files.append(FileModel(id=file_id, name=os.path.basename(path), path=path, size=stat.st_size,
+                               type="", uploaded_at="", user_id="batch"))
+
+    links = [LinkModel(id=hashlib.sha1(url.encode()).hexdigest()[:12], url=url, user_id="batch") for url in urls]
+    return files, links
+
+
+class ResultWriter:
+    """Writes results as they complete, so that a long run keeps what it has done."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_csv = path.lower().endswith(".csv")
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._lock = threading.Lock()
+        if self.is_csv:
+            self._writer = csv.DictWriter(self._file, fieldnames=OUTPUT_FIELDS, extrasaction="ignore")
+            self._writer.writeheader()
+
+    def write(self, row: dict[str, Any]) -> None:
+        with self._lock:
+            if self.is_csv:
+                self._writer.writerow(row)
+            else:
+                self._file.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def run_batch(questions: list[dict[str, str]], pipelines: list[str], writer: ResultWriter,
+              files: Optional[list] = None, links: Optional[list] = None, retriever_id: Optional[str] = None,
+              concurrency: int = 4, rate_limit: Optional[float] = None) -> dict[str, int]:
+    """
+    Run every question through the pipelines.
+
+    Models, Chroma handles and caches are process-level resources, so they are loaded once
+    and shared by the whole batch.
+
+    Args:
+        questions: Questions as {'id', 'question'} dicts
+        pipelines: Pipelines to run, "conventional" and/or "agent"
+        writer: Destination of the results
+        files: Files the questions are asked about
+        links: Links the questions are asked about
+        retriever_id: ID of an existing index, used instead of files and links
+        concurrency: Max number of queries running at the same time
+        rate_limit: Max number of queries started per second, None for no limit
+
+    Returns:
+        dict[str, int]: Number of successful and failed queries
+    """
+    from graph.run import run_agent_query
+    from prompts.conventional_query import run_conventional_query
+    from utils.llm_scheduler import PRIORITY_BATCH, llm_priority
+    from utils.tracing import add_trace_listener, remove_trace_listener
+
+    runners = {"conventional": run_conventional_query, "agent": run_agent_query}
+    bucket = TokenBucket(rate_limit, 1) if rate_limit else None
+
+    # The listener runs in the thread that ran the query, which lets each task find its trace
+    traces: dict[int, Any] = {}
+
+    def collect_trace(trace) -> None:
+        traces[threading.get_ident()] = trace
+
+    counts = {"succeeded": 0, "failed": 0}
+    counts_lock = threading.Lock()
+
+    def run_one(task: tuple[dict[str, str], str]) -> None:
+        item, pipeline = task
+        if bucket:
+            bucket.acquire()
+
+        traces.pop(threading.get_ident(), None)
+        start = time.perf_counter()
+        answer, error = "", ""
+        try:
+            # Interactive sessions sharing the OpenAI limits go first
+            with llm_priority(PRIORITY_BATCH):
+                result = runners[pipeline](query=item["question"], files=files, links=links,
+                                           retriever_id=retriever_id)
+            answer = result["answer"]
+        except Exception as e:
+            error = repr(e)
+        duration = time.perf_counter() - start
+
+        trace = traces.pop(threading.get_ident(), None)
+        breakdown = trace.breakdown() if trace else []
+        writer.write({
+            "id": item["id"],
+            "pipeline": pipeline,
+            "question": item["question"],
+            "answer": answer,
+            "error": error,
+            "duration_seconds": round(duration, 3),
+            "prompt_tokens": sum(r["prompt_tokens"] for r in breakdown),
+            "completion_tokens": sum(r["completion_tokens"] for r in breakdown),
+            "llm_calls": sum(r["calls"] for r in breakdown if r["name"].startswith("llm.")),
+            "reflection_exit_reason": trace.attributes.get("reflection_exit_reason", "") if trace else "",
+            "run_id": trace.run_id if trace else "",
+            "breakdown": breakdown,
+        })
+
+        with counts_lock:
+            counts["failed" if error else "succeeded"] += 1
+            done = counts["failed"] + counts["succeeded"]
+        print(f"[{done}/{len(tasks)}] {pipeline} {item['id']}: {'FAILED ' + error if error else f'{duration:.1f} s'}")
+
+    tasks = [(item, pipeline) for item in questions for pipeline in pipelines]
+
+    add_trace_listener(collect_trace)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(run_one, tasks))
+    finally:
+        remove_trace_listener(collect_trace)
+
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="CSV file with a 'question' column and an optional 'id' column")
+    parser.add_argument("--retriever-id", help="ID of an index built from the app")
+    parser.add_argument("--file", action="append", default=[], help="Local file to index and query, can be repeated")
+    parser.add_argument("--link", action="append", default=[], help="URL to index and query, can be repeated")
+    parser.add_argument("--pipeline", choices=["conventional", "agent", "both"], default="agent")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate-limit", type=float, help="Max number of queries started per second")
+    parser.add_argument("--output", default="batch_results.csv", help="Output file, .csv or .jsonl")
+    args = parser.parse_args()
+
+    if not args.retriever_id and not args.file and not args.link:
+        parser.error("Provide --retriever-id or at least one --file or --link")
+
+    from utils.vectorizer import vectorize
+
+    files, links = local_sources(args.file, args.link)
+    if (files or links) and not args.retriever_id and not vectorize(files, links):
+        raise SystemExit("Failed to index the files and links")
+
+    questions = read_questions(args.questions)
+    pipelines = ["conventional", "agent"] if args.pipeline == "both" else [args.pipeline]
+
+    writer = ResultWriter(args.output)
+    started = time.perf_counter()
+    try:
+        counts = run_batch(questions, pipelines, writer, files, links, args.retriever_id,
+                           args.concurrency, args.rate_limit)
+    finally:
+        writer.close()
+
+    print(f"Done in {time.perf_counter() - started:.1f} s: {counts['succeeded']} succeeded, "
+          f"{counts['failed']} failed, results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Record/replay cassettes of the OpenAI and Tavily interactions of a run.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Optional
+
+# Request fields that change between runs without changing the answer
+VOLATILE_FIELDS = {"api_key", "user", "stream_options"}
+
+
+def interaction_key(endpoint: str, body: dict[str, Any]) -> str:
+    """
+    Hash a request so that identical requests of two runs get the same key.
+
+    Args:
+        endpoint: Path of the request, e.g. "/v1/chat/completions"
+        body: JSON body of the request
+
+    Returns:
+        str: The key
+    """
+    stable = {k: v for k, v in body.items() if k not in VOLATILE_FIELDS}
+    payload = json.dumps([endpoint, stable], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class Cassette:
+    """JSONL file of recorded request/response pairs."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the cassette, loading its interactions if the file exists.
+
+        Args:
+            path: Path of the JSONL file
+        """
+        self.path = path
+        self._interactions: dict[str, list[dict[str, Any]]] = {}
+        self._positions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        interaction = json.loads(line)
+                        self._interactions.setdefault(interaction["key"], []).append(interaction)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._interactions.values())
+
+    def record(self, endpoint: str, body: dict[str, Any], status: int, response: dict[str, Any],
+               duration: float) -> None:
+        """
+        Append an interaction to the cassette.
+
+        Args:
+            endpoint: Path of the request
+            body: JSON body of the request
+            status: HTTP status of the response
+            response: JSON body of the response
+            duration: Time the upstream API took, in seconds
+        """
+        interaction = {
+            "key": interaction_key(endpoint, body),
+            "endpoint": endpoint,
+            "request": {k: v for k, v in body.items() if k not in VOLATILE_FIELDS},
+            "status": status,
+            "response": response,
+            "duration": round(duration, 4),
+        }
+        with self._lock:
+            self._interactions.setdefault(interaction["key"], []).append(interaction)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+
+    def play(self, endpoint: str, body: dict[str, Any]) -> Optional[dict[str, Any]]:
+        """
+        Get the recorded interaction for a request.
+
+        Identical requests are answered in the order they were recorded, the last
+        recording is repeated once they are used up.
+
+        Args:
+            endpoint: Path of the request
+            body: JSON body of the request
+
+        Returns:
+            Optional[dict]: The interaction, or None if the request was never recorded
+        """
+        key = interaction_key(endpoint, body)
+        with self._lock:
+            recordings = self._interactions.get(key)
+            if not recordings:
+                return None
+
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return recordings[min(position, len(recordings) - 1)]
@@ -0,0 +1,273 @@
+"""
+Concurrent-user load test for the conventional and agent query paths.
+
+Drives run_conventional_query and the LangGraph agent with N simulated users against the
+local OpenAI/Tavily stub server, and reports throughput, per-stage latency percentiles
+and resource usage:
+
+    python -m tools.load_test --users 8 --requests-per-user 5 --manual data/manual.pdf
+"""
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# Realistic mix of technician questions, weighted by how often they are asked
+QUESTION_MIX = [
+    (5, "The pump does not build up pressure, what should I check?"),
+    (4, "What is the torque specification for the impeller bolt?"),
+    (3, "How do I replace the shaft seal step by step?"),
+    (3, "Error code E-21 is shown on the controller, what does it mean and how do I fix it?"),
+    (2, "Which spare parts are needed for the 5000 hour service?"),
+    (2, "The motor overheats after a few minutes of operation, what are the possible causes?"),
+    (1, "What is the recommended lubricant for the bearings and how often should it be changed?"),
+    (1, "How do I calibrate the pressure sensor after replacing it?"),
+]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: The samples
+        p: Percentile between 0 and 100
+
+    Returns:
+        float: The percentile, 0 if there are no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(p / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def load_questions(path: Optional[str]) -> list[tuple[int, str]]:
+    """
+    Load a weighted question mix.
+
+    Args:
+        path: Text file with one question per line, optionally prefixed by "weight|"
+
+    Returns:
+        list[tuple[int, str]]: Weighted questions, the built-in mix if path is not provided
+    """
+    if not path:
+        return QUESTION_MIX
+
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            weight, _, question = line.partition("|") if "|" in line else ("1", "", line)
+            questions.append((int(weight), question))
+    return questions
+
+
+@dataclass
+class LoadTestResults:
+    """Samples collected during a load test."""
+    latencies: dict[str, list[float]] = field(default_factory=dict)
+    stage_latencies: dict[str, dict[str, list[float]]] = field(default_factory=dict)
+    errors: dict[str, int] = field(default_factory=dict)
+    peak_threads: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_trace(self, trace) -> None:
+        """Trace listener collecting per-stage durations."""
+        with self.lock:
+            stages = self.stage_latencies.setdefault(trace.kind, {})
+            for row in trace.breakdown():
+                stages.setdefault(row['name'], []).append(row['duration'])
+
+    def add_request(self, pipeline: str, duration: float, error: Optional[Exception]) -> None:
+        with self.lock:
+            self.latencies.setdefault(pipeline, []).append(duration)
+            if error is not None:
+                key = f"{pipeline}: {type(error).__name__}"
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+
+def _monitor_threads(results: LoadTestResults, stop: threading.Event) -> None:
+    while not stop.wait(0.2):
+        results.peak_threads = max(results.peak_threads, threading.active_count())
+
+
+def run_load_test(users: int, requests_per_user: int, pipelines: list[str], files: list, links: list,
+                  questions: list[tuple[int, str]], think_time: float = 0.0, seed: Optional[int] = None) -> dict[str, Any]:
+    """
+    Run the load test and build its report.
+
+    Args:
+        users: Number of concurrent simulated users
+        requests_per_user: Queries sent by each user
+        pipelines: Pipelines to drive, "conventional" and/or "agent"
+        files: Files the queries are asked about
+        links: Links the queries are asked about
+        questions: Weighted question mix
+        think_time: Mean pause between two queries of a user, in seconds
+        seed: Seed of the question and pipeline choice
+
+    Returns:
+        dict: The report
+    """
+    from graph.run import run_agent_query
+    from prompts.conventional_query import run_conventional_query
+    from utils.tracing import add_trace_listener, remove_trace_listener
+
+    runners = {"conventional": run_conventional_query, "agent": run_agent_query}
+    weights = [w for w, _ in questions]
+    texts = [q for _, q in questions]
+
+    results = LoadTestResults()
+    add_trace_listener(results.add_trace)
+    stop = threading.Event()
+    threading.Thread(target=_monitor_threads, args=(results, stop), daemon=True).start()
+
+    def simulate_user(user_index: int) -> None:
+        rng = random.Random(None if seed is None else seed + user_index)
+        for _ in range(requests_per_user):
+            pipeline = rng.choice(pipelines)
+            question = rng.choices(texts, weights)[0]
+
+            start = time.perf_counter()
+            error = None
+            try:
+                runners[pipeline](query=question, files=files, links=links)
+            except Exception as e:
+                error = e
+            results.add_request(pipeline, time.perf_counter() - start, error)
+
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=users) as pool:
+            list(pool.map(simulate_user, range(users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        stop.set()
+        remove_trace_listener(results.add_trace)
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    def stats(values: list[float]) -> dict[str, float]:
+        return {
+            "count": len(values),
+            "p50": round(percentile(values, 50), 3),
+            "p95": round(percentile(values, 95), 3),
+            "p99": round(percentile(values, 99), 3),
+            "max": round(max(values), 3) if values else 0.0,
+        }
+
+    total_requests = sum(len(v) for v in results.latencies.values())
+    return {
+        "users": users,
+        "requests": total_requests,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(total_requests / elapsed, 3) if elapsed else 0.0,
+        "errors": results.errors,
+        "latency": {p: stats(v) for p, v in results.latencies.items()},
+        "stages": {kind: {name: stats(v) for name, v in stages.items()}
+                   for kind, stages in results.stage_latencies.items()},
+        "resources": {
+            "cpu_user_seconds": round(usage_after.ru_utime - usage_before.ru_utime, 2),
+            "cpu_system_seconds": round(usage_after.ru_stime - usage_before.ru_stime, 2),
+            # ru_maxrss is in kilobytes on Linux
+            "max_rss_mb": round(usage_after.ru_maxrss / 1024, 1),
+            "peak_threads": results.peak_threads,
+        },
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    """Print a load test report as plain text tables."""
+    print(f"\nUsers: {report['users']}  Requests: {report['requests']}  "
+          f"Elapsed: {report['elapsed_seconds']} s  Throughput: {report['throughput_rps']} req/s")
+
+    print("\nEnd-to-end latency (s)")
+    print(f"{'pipeline':<40}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for pipeline, s in report["latency"].items():
+        print(f"{pipeline:<40}{s['count']:>8}{s['p50']:>9}{s['p95']:>9}{s['p99']:>9}{s['max']:>9}")
+
+    for kind, stages in report["stages"].items():
+        print(f"\nStage latency per run, {kind} (s)")
+        print(f"{'stage':<40}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for name, s in sorted(stages.items(), key=lambda item: -item[1]['p95']):
+            print(f"{name:<40}{s['count']:>8}{s['p50']:>9}{s['p95']:>9}{s['p99']:>9}{s['max']:>9}")
+
+    print("\nResources")
+    for key, value in report["resources"].items():
+        print(f"  {key}: {value}")
+
+    if report["errors"]:
+        print("\nErrors")
+        for key, count in report["errors"].items():
+            print(f"  {key}: {count}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--requests-per-user", type=int, default=3)
+    parser.add_argument("--pipeline", choices=["conventional", "agent", "both"], default="both")
+    parser.add_argument("--manual", action="append", default=[],
+                        help="Local file indexed and queried, can be repeated")
+    parser.add_argument("--questions", help="Question file, one \"weight|question\" per line")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean pause between queries, in seconds")
+    parser.add_argument("--stub-url", help="Use a running stub server instead of starting one")
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="Latency of the started stub server")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--replay", metavar="CASSETTE",
+                        help="Answer from a recorded cassette so that only local time is measured")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    # The stub has to be configured before the app modules read the config
+    if args.stub_url:
+        os.environ["AMA_STUB_SERVER_URL"] = args.stub_url
+    else:
+        from tools.cassette import Cassette
+        from tools.stub_server import StubConfig, start_stub_server
+        config = StubConfig(latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second,
+                            error_rate=args.error_rate, seed=args.seed)
+        if args.replay:
+            config.mode, config.cassette = "replay", Cassette(args.replay)
+        server = start_stub_server(config)
+        os.environ["AMA_STUB_SERVER_URL"] = server.url
+        print(f"Started stub server on {server.url}")
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    os.environ.setdefault("TAVILY_API_KEY", "stub")
+
+    from tools.batch_runner import local_sources
+    from utils.vectorizer import vectorize
+
+    files, _ = local_sources(args.manual, [])
+    if files and not vectorize(files, []):
+        raise SystemExit("Failed to index the manuals")
+
+    pipelines = ["conventional", "agent"] if args.pipeline == "both" else [args.pipeline]
+    report = run_load_test(args.users, args.requests_per_user, pipelines, files, [],
+                           load_questions(args.questions), args.think_time, args.seed)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+Local stand-in for the OpenAI chat completions and Tavily search APIs.
+
+Serves canned responses with configurable latency, token rates and error rates so that
+the pipelines can be load tested and benchmarked offline. Point the app at it with:
+
+    python -m tools.stub_server --port 8765
+    AMA_STUB_SERVER_URL=http://127.0.0.1:8765 OPENAI_API_KEY=stub TAVILY_API_KEY=stub streamlit run app.py
+
+With --record the server proxies to the real APIs and writes every interaction to a
+cassette, with --replay it answers from the cassette so runs are deterministic:
+
+    python -m tools.stub_server --record data/run.cassette.jsonl   # real API keys required
+    python -m tools.stub_server --replay data/run.cassette.jsonl
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from tools.cassette import Cassette
+
+OPENAI_UPSTREAM_URL = "https://api.openai.com"
+TAVILY_UPSTREAM_URL = "https://api.tavily.com"
+
+# Headers forwarded to the real APIs when recording
+FORWARDED_HEADERS = ["Authorization", "Content-Type", "OpenAI-Organization", "OpenAI-Project"]
+
+# Same as graph.chains.reflection.REFLECTION_END_ANSWER, not imported to keep the server free of the app's dependencies
+REFLECTION_END_ANSWER = "useful answer"
+
+DEFAULT_GENERATION = """Thought Process:
+- The question refers to a pump that does not build up pressure.
+- The troubleshooting table of the manual lists a worn impeller and a leaking shaft seal as causes.
+
+Final Answer:
+
+1. Stop the pump and isolate it electrically.
+2. Remove the casing cover and inspect the impeller for wear.
+3. Replace the impeller and the shaft seal if worn.
+4. Reassemble, prime the pump and check the discharge pressure.
+
+Brand name:
+
+Grundfos CR 10-04
+
+Part Numbers:
+
+- Impeller: 96511844
+- Shaft seal kit: 96455088
+- Casing gasket: does not have a part number in the manual
+"""
+
+# Canned responses, matched in order against the system prompt and the last message
+DEFAULT_RESPONSES = [
+    {
+        "match": "additional related questions",
+        "response": "\n".join([
+            "What are the common causes of low pump pressure?",
+            "How do I inspect the impeller for wear?",
+            "Which seals should be replaced during a pump overhaul?",
+            "What is the step by step procedure to replace the impeller?",
+        ]),
+    },
+    {"match": "maintenance technical manager", "response": REFLECTION_END_ANSWER},
+    {
+        "match": "Data analysis team lead",
+        "response": "Question: What is the price of Grundfos CR 10-04 impeller 96511844 and shaft seal kit 96455088?",
+    },
+    {"match": "", "response": DEFAULT_GENERATION},
+]
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub server."""
+    latency_distribution: str = "lognormal"
+    latency_ms: float = 400.0
+    latency_jitter_ms: float = 150.0
+    tokens_per_second: float = 80.0
+    search_latency_ms: float = 800.0
+    error_rate: float = 0.0
+    responses: list[dict[str, str]] = field(default_factory=lambda: list(DEFAULT_RESPONSES))
+    search_results: int = 5
+    seed: Optional[int] = None
+    # "stub" serves canned responses, "record" proxies and records, "replay" serves the cassette
+    mode: str = "stub"
+    cassette: Optional[Cassette] = None
+    # Sleep for the recorded upstream duration when replaying, off to measure only local time
+    replay_latency: bool = False
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return max(1, len(text) // 4)
+
+
+class StubServer(ThreadingHTTPServer):
+    """HTTP server holding the stub configuration and request counters."""
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: StubConfig):
+        super().__init__(address, StubRequestHandler)
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.random_lock = threading.Lock()
+        self.counters: dict[str, int] = {}
+
+    @property
+    def url(self) -> str:
+        """Base URL of the server, use it as AMA_STUB_SERVER_URL."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str) -> None:
+        with self.random_lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def sample_latency(self, mean_ms: float) -> float:
+        """
+        Sample a base latency in seconds from the configured distribution.
+
+        Args:
+            mean_ms: Mean latency in milliseconds
+
+        Returns:
+            float: Latency in seconds
+        """
+        jitter = self.config.latency_jitter_ms
+        with self.random_lock:
+            if self.config.latency_distribution == "fixed":
+                value = mean_ms
+            elif self.config.latency_distribution == "uniform":
+                value = self.random.uniform(mean_ms - jitter, mean_ms + jitter)
+            elif self.config.latency_distribution == "normal":
+                value = self.random.gauss(mean_ms, jitter)
+            else:
+                # Lognormal with the requested mean, gives the long tail real APIs have
+                sigma = min(1.5, jitter / mean_ms) if mean_ms > 0 else 0
+                value = self.random.lognormvariate(0, sigma) * mean_ms / math.exp(sigma ** 2 / 2)
+
+        return max(0.0, value) / 1000
+
+    def should_fail(self) -> bool:
+        with self.random_lock:
+            return self.random.random() < self.config.error_rate
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Handles the OpenAI and Tavily endpoints used by the app."""
+    server: StubServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        # Keep load tests quiet, counters are available on /stats
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: Optional[dict[str, str]] = None) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._send_json(200, {"counters": self.server.counters})
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self) -> None:
+        body = self._read_json()
+
+        if self.server.config.mode == "replay":
+            self._replay(body)
+            return
+
+        if self.server.config.mode == "record":
+            self._record(body)
+            return
+
+        if self.server.should_fail():
+            self.server.count("rate_limited")
+            self._send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit_error"}},
+                            {"Retry-After": "1"})
+            return
+
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completion(body)
+        elif self.path.rstrip("/").endswith("/search"):
+            self._search(body)
+        else:
+            self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+    def _replay(self, body: dict) -> None:
+        interaction = self.server.config.cassette.play(self.path, body)
+        if interaction is None:
+            self.server.count("replay_misses")
+            self._send_json(500, {"error": {"message": f"No recording for this request to {self.path}",
+                                            "type": "cassette_miss"}})
+            return
+
+        self.server.count("replayed")
+        if self.server.config.replay_latency:
+            time.sleep(interaction["duration"])
+        self._send_json(interaction["status"], interaction["response"])
+
+    def _record(self, body: dict) -> None:
+        upstream = OPENAI_UPSTREAM_URL if self.path.startswith("/v1/") else TAVILY_UPSTREAM_URL
+        headers = {h: self.headers[h] for h in FORWARDED_HEADERS if self.headers.get(h)}
+        request = urllib.request.Request(upstream + self.path, data=json.dumps(body).encode(),
+                                         headers=headers, method="POST")
+
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                status, data = response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            # Errors are passed through but not recorded, the client retries them
+            self.server.count("upstream_errors")
+            self._send_json(e.code, json.loads(e.read() or b"{}"))
+            return
+        duration = time.perf_counter() - start
+
+        self.server.count("recorded")
+        self.server.config.cassette.record(self.path, body, status, data, duration)
+        self._send_json(status, data)
+
+    def _chat_completion(self, body: dict) -> None:
+        self.server.count("chat_completions")
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        system = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") in ("system", "developer"))
+        last = str(messages[-1].get("content", "")) if messages else ""
+
+        content = ""
+        for rule in self.server.config.responses:
+            if re.search(rule["match"], system, re.IGNORECASE) or (rule["match"] and re.search(rule["match"], last, re.IGNORECASE)):
+                content = rule["response"]
+                break
+
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content)
+
+        delay = self.server.sample_latency(self.server.config.latency_ms)
+        if self.server.config.tokens_per_second > 0:
+            delay += completion_tokens / self.server.config.tokens_per_second
+        time.sleep(delay)
+
+        self._send_json(200, {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def _search(self, body: dict) -> None:
+        self.server.count("search")
+        query = body.get("query", "")
+        max_results = min(int(body.get("max_results") or self.server.config.search_results),
+                          self.server.config.search_results)
+
+        delay = self.server.sample_latency(self.server.config.search_latency_ms)
+        time.sleep(delay)
+
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")[:60]
+        self._send_json(200, {
+            "query": query,
+            "follow_up_questions": None,
+            "answer": None,
+            "images": [],
+            "results": [{
+                "title": f"Result {i + 1} for {query[:40]}",
+                "url": f"https://parts.example.com/{slug}/{i + 1}",
+                "content": f"{query[:80]} - in stock, price {19.9 * (i + 1):.2f} EUR excl. VAT.",
+                "score": round(1 - i / 10, 2),
+                "raw_content": None,
+            } for i in range(max_results)],
+            "response_time": round(delay, 3),
+        })
+
+
+def start_stub_server(config: Optional[StubConfig] = None, host: str = "127.0.0.1", port: int = 0) -> StubServer:
+    """
+    Start the stub server in a background thread.
+
+    Args:
+        config: Behaviour of the server, defaults are used if not provided
+        host: Interface to bind
+        port: Port to bind, 0 picks a free port
+
+    Returns:
+        StubServer: The running server, call shutdown() to stop it
+    """
+    server = StubServer((host, port), config or StubConfig())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-distribution", choices=["fixed", "uniform", "normal", "lognormal"],
+                        default="lognormal")
+    parser.add_argument("--latency-ms", type=float, default=400.0,
+                        help="Mean time to first token of chat completions")
+    parser.add_argument("--latency-jitter-ms", type=float, default=150.0,
+                        help="Spread of the latency distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0,
+                        help="Completion token rate, 0 disables the per-token delay")
+    parser.add_argument("--search-latency-ms", type=float, default=800.0)
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of requests answered with HTTP 429")
+    parser.add_argument("--responses", help="JSON file with a list of {\"match\": regex, \"response\": text} rules, "
+                                            "tried before the built-in ones")
+    parser.add_argument("--seed", type=int)
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="CASSETTE",
+                                help="Proxy to the real APIs and append every interaction to this file")
+    cassette_group.add_argument("--replay", metavar="CASSETTE", help="Answer from this recorded file")
+    parser.add_argument("--replay-latency", action="store_true",
+                        help="Sleep for the recorded upstream duration when replaying")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency_distribution=args.latency_distribution,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        tokens_per_second=args.tokens_per_second,
+        search_latency_ms=args.search_latency_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        replay_latency=args.replay_latency,
+    )
+    if args.record:
+        config.mode, config.cassette = "record", Cassette(args.record)
+    elif args.replay:
+        config.mode, config.cassette = "replay", Cassette(args.replay)
+        print(f"Loaded {len(config.cassette)} interactions from {args.replay}")
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            config.responses = json.load(f) + config.responses
+
+    server = StubServer((args.host, args.port), config)
+    print(f"Stub server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
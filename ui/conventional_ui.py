@@ -2,15 +2,17 @@
 UI components for AI queries in the Streamlit application.
 """
 import os
-import json
 import streamlit as st
 from typing import Optional
 
 from prompts.conventional_query import run_conventional_query
 from modules.auth.auth_service import User
 from modules.file.file_service import FileService
+from modules.history.history_service import MODE_CONVENTIONAL, HistoryService
+from modules.history.history_ui import HistoryUI
 from modules.link.link_service import LinkService
 from utils.vectorizer import vectorize
+from utils.cancellation import run_in_streamlit_session
 
 
 class ConventionalUI:
@@ -18,16 +20,19 @@ class ConventionalUI:
     UI components for AI queries.
     """
 
-    def __init__(self, file_service: Optional[FileService] = None, link_service: Optional[LinkService] = None):
+    def __init__(self, file_service: Optional[FileService] = None, link_service: Optional[LinkService] = None,
+                 history_service: Optional[HistoryService] = None):
         """
         Initialize the LangGraphUI.
 
         Args:
             file_service: FileService instance for accessing user files
             link_service: LinkService instance for accessing user links
+            history_service: HistoryService instance for storing the answered questions
         """
         self.file_service = file_service
         self.link_service = link_service
+        self.history_ui = HistoryUI(history_service or HistoryService(), MODE_CONVENTIONAL)
 
     def render_query_section(self, current_user: Optional[User] = None) -> None:
         """
@@ -47,10 +52,6 @@ class ConventionalUI:
                 "⚠️ OpenAI API key is not set in environment variables. Please ask your administrator to configure it.")
             return
 
-        # Initialize session state for tracking run history
-        if "conventional_history" not in st.session_state:
-            st.session_state.conventional_history = []
-
         # Create two columns for file and link selection
         st.write(
             "#### This tab simulates standard responses you would receive from a GPT-4o OpenAI model.")
@@ -154,9 +155,7 @@ class ConventionalUI:
                 for event in item["events"]:
                     messages.chat_message("ai").write(event)
 
-        if len(st.session_state.conventional_history) > 0:
-            for item in st.session_state.conventional_history:
-                display_result(item)
+        self.history_ui.render_history(current_user, display_result)
 
         if prompt := st.chat_input("Ask a Question", key="chat_query"):
             messages.chat_message("user").write(prompt)
@@ -167,27 +166,16 @@ class ConventionalUI:
             with st.spinner("Processing your query with LangGraph..."):
                 # Run the query through LangGraph, passing selected files and links
                 # Call the AI service
-                result = run_conventional_query(
+                result = run_in_streamlit_session(
+                    run_conventional_query,
                     query=prompt,
                     files=selected_files,
                     links=selected_links
                 )
 
                 # Store in history
-                st.session_state.conventional_history.append(result)
+                self.history_ui.add(current_user, result)
                 display_result(result, False)
 
-        # Option to clear history
-        if st.session_state.conventional_history:
-            st.download_button(
-                label="Download History",
-                key="conventional_chat_history_download",
-                data=json.dumps(
-                    st.session_state.conventional_history, indent=4),
-                file_name="conventional_chat_history.json",
-                mime="application/json",
-            )
-
-            if st.button("Clear History", key="clear"):
-                st.session_state.conventional_history = []
-                st.rerun()
+        # Option to download or clear history
+        self.history_ui.render_actions(current_user)
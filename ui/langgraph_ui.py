@@ -1,17 +1,19 @@
 """
 UI components for LangGraph RAG in the Streamlit application.
 """
-import json
 import os
 import streamlit as st
 from typing import Optional
 
 from modules.auth.auth_service import User
+from modules.auth.auth_ui import SESSION_ID_KEY
 from modules.file.file_service import FileService
+from modules.history.history_service import MODE_LANGGRAPH, HistoryService
+from modules.history.history_ui import HistoryUI
 from modules.link.link_service import LinkService
-from utils.ai_utils import get_retriever_id
 from utils.vectorizer import vectorize
-from graph.graph import get_graph
+from graph.run import run_agent_query
+from utils.cancellation import run_in_streamlit_session
 
 
 class LangGraphUI:
@@ -19,16 +21,19 @@ class LangGraphUI:
     UI components for LangGraph RAG.
     """
 
-    def __init__(self, file_service: Optional[FileService] = None, link_service: Optional[LinkService] = None):
+    def __init__(self, file_service: Optional[FileService] = None, link_service: Optional[LinkService] = None,
+                 history_service: Optional[HistoryService] = None):
         """
         Initialize the LangGraphUI.
 
         Args:
             file_service: FileService instance for accessing user files
             link_service: LinkService instance for accessing user links
+            history_service: HistoryService instance for storing the answered questions
         """
         self.file_service = file_service
         self.link_service = link_service
+        self.history_ui = HistoryUI(history_service or HistoryService(), MODE_LANGGRAPH)
 
     def render_langgraph_section(self, current_user: Optional[User] = None) -> None:
         """
@@ -65,10 +70,6 @@ class LangGraphUI:
         Select specific files and links to include in your vector database.
         """)
 
-        # Initialize session state for tracking run history
-        if "langgraph_history" not in st.session_state:
-            st.session_state.langgraph_history = []
-
         # Create two columns for file and link selection
         col1, col2 = st.columns(2)
 
@@ -169,11 +170,16 @@ class LangGraphUI:
                 for event in item["events"]:
                     messages.chat_message("ai").write(event)
 
-        if len(st.session_state.langgraph_history) > 0:
-            for item in st.session_state.langgraph_history:
-                display_result(item)
+        self.history_ui.render_history(current_user, display_result)
+
+        # A failed run is checkpointed, asking the same question again resumes it
+        retry_prompt = None
+        if failed_run := st.session_state.get("langgraph_failed_run"):
+            messages.chat_message("ai").error(f"The last run failed: {failed_run['error']}")
+            if st.button("Retry from the last completed step"):
+                retry_prompt = failed_run["question"]
 
-        if prompt := st.chat_input("Ask a Question"):
+        if prompt := st.chat_input("Ask a Question") or retry_prompt:
 
             messages.chat_message("user").write(prompt)
             if not selected_files and not selected_links:
@@ -182,29 +188,23 @@ class LangGraphUI:
 
             with st.spinner("Processing your query with LangGraph..."):
                 # Run the query through LangGraph, passing selected files and links
-                retriever_id = get_retriever_id(selected_files, selected_links)
-                inputs = {"question": prompt, "retriever_id": retriever_id}
-                app = get_graph()
-                final_state = app.invoke(inputs)
-                result = {
-                    "question": prompt,
-                    "answer": final_state["generation"],
-                    "events": []
-                }
+                try:
+                    result = run_in_streamlit_session(
+                        run_agent_query,
+                        query=prompt,
+                        files=selected_files,
+                        links=selected_links,
+                        session_id=st.session_state.get(SESSION_ID_KEY)
+                    )
+                except Exception as e:
+                    st.session_state.langgraph_failed_run = {"question": prompt, "error": str(e)}
+                    st.rerun()
+
+                st.session_state.pop("langgraph_failed_run", None)
 
                 # Store in history
-                st.session_state.langgraph_history.append(result)
+                self.history_ui.add(current_user, result)
                 display_result(result, False)
 
-        # Option to clear history
-        if st.session_state.langgraph_history:
-            st.download_button(
-                label="Download History",
-                key="rag_chat_history_download",
-                data=json.dumps(st.session_state.langgraph_history, indent=4),
-                file_name="rag_chat_history.json",
-                mime="application/json",
-            )
-            if st.button("Clear History"):
-                st.session_state.langgraph_history = []
-                st.rerun()
+        # Option to download or clear history
+        self.history_ui.render_actions(current_user)
@@ -10,9 +10,10 @@ from openai import OpenAI
 from sentence_transformers import CrossEncoder
 import streamlit as st
 
-from config.config import CHROMA_PATH
+from config.config import CHROMA_PATH, OPENAI_BASE_URL
 from modules.file.file_model import FileModel
 from modules.link.link_model import LinkModel
+from utils.tracing import span
 
 EMPTY_RETRIEVER_ID = "default"
 
@@ -23,12 +24,27 @@ def check_api_key():
 
 @st.cache_resource
 def get_ai_client():
-    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    # Retries are done by the LLM scheduler
+    return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), base_url=OPENAI_BASE_URL, max_retries=0)
 
 @st.cache_resource
 def get_chroma_client():
     return chromadb.PersistentClient(path=CHROMA_PATH)
 
+@st.cache_resource
+def get_embedding_function():
+    return SentenceTransformerEmbeddingFunction()
+
+@st.cache_resource
+def get_cross_encoder():
+    return CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+
+@st.cache_resource
+def get_chroma_collection(retriever_id: str):
+    """Get the Chroma collection of a retriever, the handle is shared by every session"""
+    collection_name = f"rag-chroma-{retriever_id}"
+    return get_chroma_client().get_collection(collection_name, embedding_function=get_embedding_function())
+
 def get_retriever_id(files: list[FileModel], links: list[LinkModel]) -> str:
     """Generate a unique ID for a set of files and links"""
     # Sort and combine file IDs and link IDs
@@ -45,57 +61,55 @@ def get_retriever_id(files: list[FileModel], links: list[LinkModel]) -> str:
 
     return retriever_id
 
-def conventional_ai_retriever(query: str, files=None, links=None) -> list[str]:
+def conventional_ai_retriever(query: str, files=None, links=None, retriever_id: str | None = None) -> list[str]:
     # Get collection name
-    retriever_id = get_retriever_id(files or [], links or [])
+    retriever_id = retriever_id or get_retriever_id(files or [], links or [])
     if retriever_id == EMPTY_RETRIEVER_ID:
         return []
 
-    collection_name = f"rag-chroma-{retriever_id}"
-
-    embedding_function = SentenceTransformerEmbeddingFunction()
-    chroma_client = get_chroma_client()
-    chroma_collection = chroma_client.get_collection(collection_name, embedding_function=embedding_function)
+    chroma_collection = get_chroma_collection(retriever_id)
 
-    results = chroma_collection.query(query_texts=[query], n_results=5)
+    with span("retrieval.chroma_query", queries=1):
+        results = chroma_collection.query(query_texts=[query], n_results=5)
     return results['documents'][0]
 
 
-def rag_ai_retriever(queries: list[str], retriever_id: str) -> list[str]:
+def rag_ai_retriever(queries: list[str], retriever_id: str) -> tuple[list[str], list[str], list[float]]:
+    """Retrieve the chunks of every query and rerank them, returns the ids, text and scores of the best chunks"""
     if retriever_id == EMPTY_RETRIEVER_ID:
-        return []
-
-    # Get collection name
-    collection_name = f"rag-chroma-{retriever_id}"
+        return [], [], []
 
-    embedding_function = SentenceTransformerEmbeddingFunction()
-    chroma_client = get_chroma_client()
-    chroma_collection = chroma_client.get_collection(collection_name, embedding_function=embedding_function)
+    chroma_collection = get_chroma_collection(retriever_id)
 
-    results = chroma_collection.query(query_texts=queries, n_results=10, include=['documents', 'embeddings'])
-    retrieved_documents = results['documents']
+    with span("retrieval.chroma_query", queries=len(queries)):
+        results = chroma_collection.query(query_texts=queries, n_results=10, include=['documents'])
 
-    unique_documents = set()
-    for documents in retrieved_documents:
-        for document in documents:
-            unique_documents.add(document)
+    # The same chunk is usually retrieved by several queries
+    unique_documents = {}
+    for ids, documents in zip(results['ids'], results['documents']):
+        for chunk_id, document in zip(ids, documents):
+            unique_documents[chunk_id] = document
 
-    unique_documents = list(unique_documents)
+    chunk_ids = list(unique_documents)
 
     pairs = []
-    for doc in unique_documents:
-        pairs.append([queries[0], doc])
+    for chunk_id in chunk_ids:
+        pairs.append([queries[0], unique_documents[chunk_id]])
 
-    cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-    scores = cross_encoder.predict(pairs)
+    with span("retrieval.rerank", pairs=len(pairs)):
+        scores = get_cross_encoder().predict(pairs)
 
     ordered_list = []
     for o in np.argsort(scores)[::-1]:
         ordered_list.append(o)
 
+    ranked_ids = []
     ranked_retrieved_documents =[]
+    ranked_scores = []
     number_of_doc_needed = 15
-    for i in range(number_of_doc_needed):
-        ranked_retrieved_documents.append(pairs[ordered_list[i]][1])
+    for i in ordered_list[:number_of_doc_needed]:
+        ranked_ids.append(chunk_ids[i])
+        ranked_retrieved_documents.append(pairs[i][1])
+        ranked_scores.append(float(scores[i]))
 
-    return ranked_retrieved_documents
+    return ranked_ids, ranked_retrieved_documents, ranked_scores
@@ -0,0 +1,185 @@
+"""
+Cooperative cancellation of query runs
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+import streamlit as st
+
+T = TypeVar("T")
+
+_current_token: ContextVar[Optional["CancellationToken"]] = ContextVar("cancellation_token", default=None)
+
+
+class QueryCancelledError(Exception):
+    """Raised at the next cancellation point of a run that was cancelled."""
+
+
+class CancellationToken:
+    """Flag shared by a run and whoever may abandon it."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """
+        Cancel the run, it stops at its next cancellation point.
+
+        Args:
+            reason: Why the run was cancelled, reported in the error
+        """
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise QueryCancelledError(self.reason)
+
+    def wait(self, seconds: float) -> bool:
+        """
+        Sleep until the timeout or the cancellation, whichever comes first.
+
+        Returns:
+            bool: Whether the run was cancelled
+        """
+        return self._event.wait(seconds)
+
+
+@contextmanager
+def cancellation_scope(token: CancellationToken) -> Iterator[CancellationToken]:
+    """
+    Make a token the cancellation token of the code run in this context.
+
+    Args:
+        token: The token
+
+    Yields:
+        CancellationToken: The token
+    """
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def check_cancelled() -> None:
+    """Cancellation point, raises QueryCancelledError if the current run was cancelled."""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellable_sleep(seconds: float) -> None:
+    """
+    Sleep, waking up and raising QueryCancelledError as soon as the current run is cancelled.
+
+    Args:
+        seconds: Time to sleep
+    """
+    token = _current_token.get()
+    if token is None:
+        time.sleep(seconds)
+        return
+
+    if token.wait(seconds):
+        token.raise_if_cancelled()
+
+
+def cancellable_node(node: Callable) -> Callable:
+    """
+    Wrap a graph node so that a cancelled run stops before the node starts.
+
+    Args:
+        node: The node function
+
+    Returns:
+        Callable: The wrapped node
+    """
+    @wraps(node)
+    def wrapper(state, *args, **kwargs):
+        check_cancelled()
+        return node(state, *args, **kwargs)
+
+    return wrapper
+
+
+def _run_in_scope(token: CancellationToken, fn: Callable[..., T], args: tuple, kwargs: dict) -> T:
+    with cancellation_scope(token):
+        return fn(*args, **kwargs)
+
+
+def run_cancellable(fn: Callable[..., T], *args: Any, on_poll: Optional[Callable[[float], None]] = None,
+                    poll_seconds: float = 0.5, **kwargs: Any) -> T:
+    """
+    Run fn in a worker thread and cancel it if the calling thread is interrupted.
+
+    The calling thread waits for the result, calling on_poll in between. Any exception raised
+    while waiting, including the ones raised by on_poll, cancels the run.
+
+    Args:
+        fn: Function running the query
+        args: Positional arguments of fn
+        on_poll: Called with the elapsed seconds every poll_seconds while fn runs
+        poll_seconds: Time between two calls of on_poll
+        kwargs: Keyword arguments of fn
+
+    Returns:
+        T: The result of fn
+    """
+    token = CancellationToken()
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query")
+    future = executor.submit(copy_context().run, _run_in_scope, token, fn, args, kwargs)
+    start = time.perf_counter()
+
+    try:
+        # Errors raised by fn, TimeoutError included, are only raised once it is done
+        while not wait([future], timeout=poll_seconds).done:
+            if on_poll is not None:
+                on_poll(time.perf_counter() - start)
+        return future.result()
+    except BaseException as e:
+        token.cancel(f"abandoned by the caller ({type(e).__name__})")
+        raise
+    finally:
+        executor.shutdown(wait=False)
+
+
+def run_in_streamlit_session(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run a query for the current Streamlit script run.
+
+    Streamlit interrupts a script run at its next element update when the user submits a new
+    question, the page reruns or the session closes. The script thread therefore waits for the
+    query while updating a status line, and the interruption cancels the query so that it stops
+    at its next node, LLM call or web search instead of running to completion.
+
+    Args:
+        fn: Function running the query
+        args: Positional arguments of fn
+        kwargs: Keyword arguments of fn
+
+    Returns:
+        T: The result of fn
+    """
+    status = st.empty()
+
+    def show_elapsed(elapsed: float) -> None:
+        status.caption(f"Running for {elapsed:.0f} s")
+
+    try:
+        return run_cancellable(fn, *args, on_poll=show_elapsed, **kwargs)
+    finally:
+        status.empty()
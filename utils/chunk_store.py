@@ -0,0 +1,65 @@
+"""
+Chunk text of the runs in progress, so that graph state only carries chunk ids
+"""
+
+import streamlit as st
+
+from config.config import CHUNK_STORE_MAX_SIZE, CHUNK_STORE_TTL_SECONDS
+from utils.ai_utils import get_chroma_collection
+from utils.cache import TTLCache
+from utils.tracing import span
+
+
+class ChunkStore:
+    """Chunk text by retriever and chunk id, the text is fetched again from Chroma once evicted."""
+
+    def __init__(self, ttl_seconds: float, max_size: int):
+        """
+        Initialize the store.
+
+        Args:
+            ttl_seconds: How long the text of a chunk is kept after its last use
+            max_size: Max number of chunks kept
+        """
+        self._cache = TTLCache(ttl_seconds=ttl_seconds, max_size=max_size)
+
+    def put(self, retriever_id: str, ids: list[str], texts: list[str]) -> None:
+        """
+        Keep the text of retrieved chunks.
+
+        Args:
+            retriever_id: ID of the index the chunks come from
+            ids: Chroma ids of the chunks
+            texts: Text of the chunks
+        """
+        for chunk_id, text in zip(ids, texts):
+            self._cache.set((retriever_id, chunk_id), text)
+
+    def resolve(self, retriever_id: str, ids: list[str]) -> list[str]:
+        """
+        Get the text of chunks, in the order of their ids.
+
+        Args:
+            retriever_id: ID of the index the chunks come from
+            ids: Chroma ids of the chunks
+
+        Returns:
+            list[str]: Text of the chunks, chunks missing from the index are left out
+        """
+        texts = {chunk_id: self._cache.get((retriever_id, chunk_id)) for chunk_id in ids}
+
+        missing = [chunk_id for chunk_id, text in texts.items() if text is None]
+        if missing:
+            # Evicted, or retrieved by a run resumed in another process
+            with span("retrieval.chunk_fetch", chunks=len(missing)):
+                results = get_chroma_collection(retriever_id).get(ids=missing, include=['documents'])
+            for chunk_id, text in zip(results['ids'], results['documents']):
+                texts[chunk_id] = text
+                self._cache.set((retriever_id, chunk_id), text)
+
+        return [texts[chunk_id] for chunk_id in ids if texts[chunk_id] is not None]
+
+
+@st.cache_resource
+def get_chunk_store() -> ChunkStore:
+    return ChunkStore(CHUNK_STORE_TTL_SECONDS, CHUNK_STORE_MAX_SIZE)
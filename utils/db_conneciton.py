@@ -2,12 +2,162 @@
 Db connection context manager
 """
 
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
 from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterable, Iterator, Optional, Sequence
+
 import psycopg2
+from psycopg2.extensions import register_adapter
+from psycopg2.extras import Json
+from psycopg2.pool import ThreadedConnectionPool
 
 import streamlit as st
 from supabase import create_client, Client
 
+from config.config import (DB_POOL_ACQUIRE_TIMEOUT_SECONDS, DB_POOL_HEALTH_CHECK_IDLE_SECONDS, DB_POOL_MAX_SIZE,
+                           DB_POOL_MIN_SIZE, SQLITE_BUSY_TIMEOUT_SECONDS, SQLITE_PATH, STORAGE_BACKEND)
+
+DIALECT_POSTGRES = "postgres"
+DIALECT_SQLITE = "sqlite"
+
+# Adapters and converters are process-wide, so they are registered once here rather than by
+# each backend. Services pass dicts for jsonb columns and read them back decoded on both
+# backends, and SQLite reads TIMESTAMPTZ columns as datetimes like psycopg2 does
+register_adapter(dict, Json)
+sqlite3.register_adapter(dict, json.dumps)
+sqlite3.register_adapter(datetime, datetime.isoformat)
+sqlite3.register_converter("TIMESTAMPTZ", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("JSONB", json.loads)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no database connection became free in time."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of Postgres connections shared by every session.
+
+    Callers wait for a free connection instead of failing when the pool is exhausted.
+    Connections idle for a while are checked before being handed out, and broken ones
+    are discarded so that the next checkout reconnects.
+    """
+
+    def __init__(self, min_size: int, max_size: int, acquire_timeout: float, health_check_idle: float,
+                 **connect_kwargs: Any):
+        """
+        Initialize the pool.
+
+        Args:
+            min_size: Number of connections opened up front and kept open
+            max_size: Max number of open connections
+            acquire_timeout: Max time to wait for a free connection, in seconds
+            health_check_idle: Connections idle for longer are checked with a SELECT 1
+            connect_kwargs: Arguments of psycopg2.connect
+        """
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_idle = health_check_idle
+        self._pool = ThreadedConnectionPool(min_size, max_size, **connect_kwargs)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used: dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._stats = {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                       "timeouts": 0, "reconnects": 0, "in_use": 0}
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle < self.health_check_idle:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Check out a connection, waiting for one to be returned if the pool is exhausted.
+
+        Returns:
+            connection: A healthy connection, to be returned with putconn
+        """
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise PoolTimeoutError(f"No database connection free after {self.acquire_timeout} s")
+        wait = time.perf_counter() - start
+
+        try:
+            conn = self._pool.getconn()
+            while not self._is_healthy(conn):
+                # The server dropped it, open a new one in its place
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self._stats["reconnects"] += 1
+                conn = self._pool.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_seconds"] += wait
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+            if wait > 0.001:
+                self._stats["waits"] += 1
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """
+        Return a checked out connection.
+
+        Args:
+            conn: The connection
+            close: Close the connection instead of keeping it, e.g. after it broke
+        """
+        close = close or bool(conn.closed)
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+
+        try:
+            self._pool.putconn(conn, close=close)
+        finally:
+            with self._lock:
+                self._stats["in_use"] -= 1
+            self._slots.release()
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Get the pool metrics.
+
+        Returns:
+            dict: Checkouts, waits, total and max wait time, timeouts, reconnects and connections in use
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_wait_seconds"] = stats["wait_seconds"] / stats["checkouts"] if stats["checkouts"] else 0.0
+        stats["max_size"] = self.max_size
+        return stats
+
 
 @st.cache_resource
 def get_supabase_client() -> Client:
@@ -15,21 +165,244 @@ def get_supabase_client() -> Client:
 
 
 @st.cache_resource
-def get_db_connection():
-    return psycopg2.connect(
+def get_db_pool() -> ConnectionPool:
+    return ConnectionPool(
+        DB_POOL_MIN_SIZE,
+        DB_POOL_MAX_SIZE,
+        DB_POOL_ACQUIRE_TIMEOUT_SECONDS,
+        DB_POOL_HEALTH_CHECK_IDLE_SECONDS,
         database=st.secrets.db["DB_NAME"],
         user=st.secrets.db["DB_USER"],
         password=st.secrets.db["DB_PASSWORD"],
         host=st.secrets.db["DB_HOST"],
-        port=st.secrets.db["DB_PORT"]
+        port=st.secrets.db["DB_PORT"],
+        # Notice dropped connections instead of hanging on them
+        keepalives=1,
+        keepalives_idle=30,
     )
 
 
+class StorageBackend(ABC):
+    """
+    Database the services store their data in.
+
+    Services write their queries with %s placeholders and run them on the cursor yielded by
+    connection. The few queries that cannot be written portably are chosen by dialect.
+    """
+
+    dialect: str
+
+    @abstractmethod
+    @contextmanager
+    def connection(self, name: Optional[str] = None, itersize: int = 2000) -> Iterator[Any]:
+        """
+        Run statements in a transaction.
+
+        Args:
+            name: Name of a server-side cursor, for queries whose rows should be fetched in batches
+            itersize: Rows fetched per batch by a server-side cursor
+
+        Yields:
+            cursor: A cursor on the connection
+        """
+
+    @abstractmethod
+    def lock(self, cursor, lock_id: int) -> None:
+        """
+        Serialize the rest of the transaction with the other processes taking the same lock.
+
+        Args:
+            cursor: Cursor of the transaction, the lock is released when it ends
+            lock_id: Identifier of the lock
+        """
+
+
+class PostgresBackend(StorageBackend):
+    """Postgres database configured in st.secrets.db, through the shared connection pool."""
+
+    dialect = DIALECT_POSTGRES
+
+    @contextmanager
+    def connection(self, name: Optional[str] = None, itersize: int = 2000) -> Iterator[Any]:
+        """
+        Run statements in a transaction on a pooled connection.
+
+        The transaction is committed when the block exits normally and rolled back when it
+        raises, so a failed statement never leaves the connection unusable for other sessions.
+
+        Args:
+            name: Name of a server-side cursor, whose rows are fetched in batches while they are
+                iterated instead of all at once. It can only run a single query
+            itersize: Rows fetched per batch by a server-side cursor
+
+        Yields:
+            cursor: A cursor on the connection
+        """
+        pool = get_db_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            with conn.cursor(name=name) as cursor:
+                if name:
+                    cursor.itersize = itersize
+                yield cursor
+            conn.commit()
+        except BaseException as e:
+            broken = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+            raise
+        finally:
+            pool.putconn(conn, close=broken)
+
+    def lock(self, cursor, lock_id: int) -> None:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (lock_id,))
+
+
+class SQLiteCursor:
+    """Cursor of a SQLite connection that accepts the %s placeholders of psycopg2."""
+
+    _PLACEHOLDER = re.compile(r"%([s%])")
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def _translate(self, query: str) -> str:
+        return self._PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", query)
+
+    def execute(self, query: str, params: Sequence[Any] = ()) -> "SQLiteCursor":
+        self._cursor.execute(self._translate(query), params)
+        return self
+
+    def executemany(self, query: str, params_seq: Iterable[Sequence[Any]]) -> "SQLiteCursor":
+        self._cursor.executemany(self._translate(query), params_seq)
+        return self
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._cursor.fetchone()
+
+    def fetchall(self) -> list[tuple]:
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size: int) -> list[tuple]:
+        return self._cursor.fetchmany(size)
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._cursor)
+
+
+def _sqlite_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded SQLite database in WAL mode.
+
+    Readers never wait for the writer, and connections are reused across sessions.
+    Columns declared TIMESTAMPTZ are read as datetimes and columns declared JSONB as
+    decoded JSON, like psycopg2 reads them from Postgres, and now() returns the current
+    UTC time in the format the app writes timestamps in.
+    """
+
+    dialect = DIALECT_SQLITE
+
+    def __init__(self, path: str, busy_timeout: float):
+        """
+        Initialize the backend.
+
+        Args:
+            path: Path of the database file, created if missing
+            busy_timeout: Max time to wait for the write lock, in seconds
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._idle: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are started explicitly, see connection
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.create_function("now", 0, _sqlite_now)
+        return conn
+
+    @contextmanager
+    def connection(self, name: Optional[str] = None, itersize: int = 2000) -> Iterator[Any]:
+        """
+        Run statements in a transaction on a reused connection.
+
+        Args:
+            name: Ignored, SQLite cursors always fetch rows as they are iterated
+            itersize: Ignored
+
+        Yields:
+            cursor: A cursor on the connection
+        """
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        broken = False
+        try:
+            conn.execute("BEGIN")
+            yield SQLiteCursor(conn.cursor())
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    broken = True
+            raise
+        finally:
+            if broken:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def lock(self, cursor, lock_id: int) -> None:
+        # A SQLite database has a single writer, so take the write lock up front instead of at
+        # the first write. The deferred transaction has not run anything yet
+        cursor.execute("COMMIT")
+        cursor.execute("BEGIN IMMEDIATE")
+
+
+@st.cache_resource
+def get_storage_backend() -> StorageBackend:
+    if STORAGE_BACKEND == DIALECT_SQLITE:
+        return SQLiteBackend(SQLITE_PATH, SQLITE_BUSY_TIMEOUT_SECONDS)
+    if STORAGE_BACKEND == DIALECT_POSTGRES:
+        return PostgresBackend()
+    raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+
+
 @contextmanager
-def db_conneciton():
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def db_conneciton(name: Optional[str] = None, itersize: int = 2000) -> Iterator[Any]:
+    """
+    Run statements in a transaction on the configured storage backend.
+
+    The transaction is committed when the block exits normally and rolled back when it raises.
 
-    yield cursor
+    Args:
+        name: Name of a server-side cursor, whose rows are fetched in batches while they are
+            iterated instead of all at once. It can only run a single query
+        itersize: Rows fetched per batch by a server-side cursor
 
-    conn.commit()
+    Yields:
+        cursor: A cursor on the connection
+    """
+    with get_storage_backend().connection(name, itersize) as cursor:
+        yield cursor
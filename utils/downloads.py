@@ -0,0 +1,65 @@
+"""
+Files prepared for a download button of the current session
+"""
+
+import os
+import tempfile
+from typing import Iterable, Optional
+
+import streamlit as st
+
+
+def prepare_download(key: str, chunks: Iterable[str], suffix: str) -> str:
+    """
+    Write a download to a temporary file kept for the current session.
+
+    The file it replaces is deleted, so a session holds at most one file per key.
+
+    Args:
+        key: Key of the file in st.session_state
+        chunks: Content of the file
+        suffix: Extension of the file, e.g. ".json"
+
+    Returns:
+        str: Path of the file
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False, encoding="utf-8", newline="") as f:
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+
+    discard_download(key)
+    st.session_state[key] = f.name
+    return f.name
+
+
+def get_download(key: str) -> Optional[str]:
+    """
+    Get the file prepared for a download.
+
+    Args:
+        key: Key of the file in st.session_state
+
+    Returns:
+        Optional[str]: Path of the file, None if there is none
+    """
+    path = st.session_state.get(key)
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+def discard_download(key: str) -> None:
+    """
+    Delete the file prepared for a download.
+
+    Args:
+        key: Key of the file in st.session_state
+    """
+    path = st.session_state.pop(key, None)
+    if path and os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,246 @@
+"""
+Process-wide scheduler for OpenAI calls with rate limits, retries and hedging
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Iterator, Optional, TypeVar
+
+import openai
+import streamlit as st
+
+from config.config import (LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS, LLM_DEFAULT_RATE_LIMIT,
+                           LLM_HEDGING_ENABLED, LLM_MAX_RETRIES, LLM_RATE_LIMITS)
+from utils.cancellation import cancellable_sleep, check_cancelled
+from utils.rate_limit import TokenBucket
+from utils.tracing import get_current_span
+
+T = TypeVar("T")
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Number of recent latencies the hedging threshold is computed from
+LATENCY_WINDOW = 200
+MIN_HEDGING_SAMPLES = 20
+
+
+@contextmanager
+def llm_priority(priority: int) -> Iterator[None]:
+    """
+    Set the priority of the LLM calls made in this context, e.g. PRIORITY_BATCH for batch runs.
+
+    Args:
+        priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return max(1, len(text) // 4)
+
+
+class _ModelQueue:
+    """Rate limits and latency statistics of one model."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute / 60, max(1.0, requests_per_minute / 60 * 5))
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 6)
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.interactive_waiting = 0
+        self.lock = threading.Lock()
+
+    def p95(self) -> Optional[float]:
+        with self.lock:
+            if len(self.latencies) < MIN_HEDGING_SAMPLES:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class LLMScheduler:
+    """
+    Coordinates the OpenAI calls of every session of the process.
+
+    Each model has token buckets for requests and tokens. Interactive calls go before
+    batch calls, retryable errors are retried with exponential backoff and full jitter,
+    and calls slower than the model's p95 can be hedged with a second request.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float]], default_limit: tuple[float, float],
+                 max_retries: int = LLM_MAX_RETRIES, hedging: bool = LLM_HEDGING_ENABLED):
+        """
+        Initialize the scheduler.
+
+        Args:
+            limits: Model name mapped to (requests per minute, tokens per minute)
+            default_limit: Limits of models missing from limits
+            max_retries: Max number of retries of a call
+            hedging: Whether slow calls are hedged
+        """
+        self.limits = limits
+        self.default_limit = default_limit
+        self.max_retries = max_retries
+        self.hedging = hedging
+        self._queues: dict[str, _ModelQueue] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+    def _queue(self, model: str) -> _ModelQueue:
+        with self._lock:
+            if model not in self._queues:
+                self._queues[model] = _ModelQueue(*self.limits.get(model, self.default_limit))
+            return self._queues[model]
+
+    def _acquire(self, queue: _ModelQueue, tokens: int, priority: int) -> None:
+        interactive = priority == PRIORITY_INTERACTIVE
+        if interactive:
+            with queue.lock:
+                queue.interactive_waiting += 1
+
+        try:
+            while True:
+                # Batch calls step aside while interactive calls are waiting for capacity
+                if not interactive and queue.interactive_waiting:
+                    cancellable_sleep(0.05)
+                    continue
+
+                wait_seconds = queue.requests.try_acquire()
+                if wait_seconds == 0:
+                    wait_seconds = queue.tokens.try_acquire(tokens)
+                    if wait_seconds == 0:
+                        return
+                    # Give back the request slot while waiting for tokens
+                    queue.requests.release()
+                cancellable_sleep(min(wait_seconds, 1.0))
+        finally:
+            if interactive:
+                with queue.lock:
+                    queue.interactive_waiting -= 1
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            retry_after = response.headers.get('retry-after')
+
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+
+        # Full jitter
+        return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+    def _run_hedged(self, queue: _ModelQueue, fn: Callable[[], T], tokens: int) -> tuple[T, bool]:
+        p95 = queue.p95() if self.hedging else None
+        if p95 is None:
+            return fn(), False
+
+        first = self._hedge_pool.submit(copy_context().run, fn)
+        done, _ = wait([first], timeout=p95)
+        if done:
+            return first.result(), False
+
+        # Only hedge when there is spare capacity, hedging must not cause 429s itself
+        if queue.requests.try_acquire() > 0:
+            return first.result(), False
+        if queue.tokens.try_acquire(tokens) > 0:
+            queue.requests.release()
+            return first.result(), False
+
+        second = self._hedge_pool.submit(copy_context().run, fn)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None or not pending:
+                    return future.result(), True
+
+        return first.result(), True
+
+    def call(self, model: str, fn: Callable[[], T], estimated_tokens: int = 1000,
+             priority: Optional[int] = None) -> T:
+        """
+        Run an OpenAI call under the model's rate limits.
+
+        Args:
+            model: Name of the model called
+            fn: Function making the call, it must not retry by itself
+            estimated_tokens: Expected prompt plus completion tokens
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH, defaults to the llm_priority context
+
+        Returns:
+            T: The result of fn
+        """
+        queue = self._queue(model)
+        priority = _priority.get() if priority is None else priority
+        current = get_current_span()
+
+        attempt = 0
+        while True:
+            # A cancelled run stops before each request it would send
+            check_cancelled()
+            self._acquire(queue, estimated_tokens, priority)
+            check_cancelled()
+
+            start = time.perf_counter()
+            try:
+                result, hedged = self._run_hedged(queue, fn, estimated_tokens)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                print(f"Retrying {model} call in {delay:.1f} s after {type(e).__name__}")
+                attempt += 1
+                if current is not None:
+                    current.set(retries=attempt)
+                cancellable_sleep(delay)
+                continue
+
+            with queue.lock:
+                queue.latencies.append(time.perf_counter() - start)
+            if current is not None and hedged:
+                current.set(hedged=True)
+            return result
+
+
+@st.cache_resource
+def get_llm_scheduler() -> LLMScheduler:
+    return LLMScheduler(LLM_RATE_LIMITS, LLM_DEFAULT_RATE_LIMIT)
+
+
+def schedule_llm_call(model: str, fn: Callable[[], T], prompt: str = "", max_completion_tokens: int = 1000) -> T:
+    """
+    Run an OpenAI call through the process-wide scheduler.
+
+    Args:
+        model: Name of the model called
+        fn: Function making the call
+        prompt: Prompt text, used to estimate the tokens of the call
+        max_completion_tokens: Expected completion tokens
+
+    Returns:
+        T: The result of fn
+    """
+    return get_llm_scheduler().call(model, fn, estimate_tokens(prompt) + max_completion_tokens)
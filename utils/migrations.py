@@ -0,0 +1,267 @@
+"""
+Versioned database migrations, applied once per deployment
+"""
+
+from typing import NamedTuple, Optional
+
+from config.config import LEGACY_TIMESTAMP_TIME_ZONE
+from utils.db_conneciton import DIALECT_POSTGRES, DIALECT_SQLITE, db_conneciton, get_storage_backend
+
+# Any constant works, it only has to be the same for every process of the app
+MIGRATION_LOCK_ID = 4_711_2025
+
+
+class Migration(NamedTuple):
+    """A schema change, applied in a single transaction."""
+    version: int
+    name: str
+    statements: list[str]
+
+
+def _local_to_timestamptz(column: str) -> str:
+    """Clause converting a TIMESTAMP column holding local times of the app hosts to TIMESTAMPTZ."""
+    return f"ALTER COLUMN {column} TYPE TIMESTAMPTZ USING {column} AT TIME ZONE '{LEGACY_TIMESTAMP_TIME_ZONE}'"
+
+
+MIGRATIONS: list[Migration] = [
+    # The tables the services used to create on startup, existing deployments already have them
+    Migration(1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            name TEXT,
+            created_at TIMESTAMP NOT NULL
+        )
+        ''',
+        'ALTER TABLE users ENABLE ROW LEVEL SECURITY',
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            expires_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'ALTER TABLE sessions ENABLE ROW LEVEL SECURITY',
+        '''
+        CREATE TABLE IF NOT EXISTS files (
+            file_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            type TEXT,
+            uploaded_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'ALTER TABLE files ENABLE ROW LEVEL SECURITY',
+        '''
+        CREATE TABLE IF NOT EXISTS links (
+            link_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            description TEXT,
+            added_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'ALTER TABLE links ENABLE ROW LEVEL SECURITY',
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            question_id TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            answers TEXT NOT NULL
+        )
+        ''',
+        'ALTER TABLE questions ENABLE ROW LEVEL SECURITY',
+        '''
+        CREATE TABLE IF NOT EXISTS answers (
+            answer_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            answers TEXT NOT NULL,
+            comment TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'ALTER TABLE answers ENABLE ROW LEVEL SECURITY',
+    ]),
+    # Timestamps had no time zone, and every per-user query scanned its table. The app wrote them
+    # in the local time of its hosts, LEGACY_TIMESTAMP_TIME_ZONE
+    Migration(2, "native timestamps and indexes", [
+        f"ALTER TABLE users {_local_to_timestamptz('created_at')}",
+        f'''
+        ALTER TABLE sessions
+            {_local_to_timestamptz('created_at')},
+            {_local_to_timestamptz('expires_at')}
+        ''',
+        f"ALTER TABLE files {_local_to_timestamptz('uploaded_at')}",
+        f"ALTER TABLE links {_local_to_timestamptz('added_at')}",
+        f"ALTER TABLE answers {_local_to_timestamptz('created_at')}",
+        'CREATE INDEX IF NOT EXISTS files_user_id_uploaded_at_idx ON files (user_id, uploaded_at DESC)',
+        'CREATE INDEX IF NOT EXISTS links_user_id_added_at_idx ON links (user_id, added_at DESC)',
+        'CREATE INDEX IF NOT EXISTS answers_user_id_idx ON answers (user_id)',
+        'CREATE INDEX IF NOT EXISTS sessions_user_id_idx ON sessions (user_id)',
+        'CREATE INDEX IF NOT EXISTS sessions_expires_at_idx ON sessions (expires_at)',
+    ]),
+    # Answers were JSON strings parsed in Python, so nothing could be filtered or counted in SQL
+    Migration(3, "jsonb feedback answers", [
+        'ALTER TABLE answers ALTER COLUMN answers TYPE JSONB USING answers::jsonb',
+    ]),
+    Migration(4, "query history", [
+        '''
+        CREATE TABLE IF NOT EXISTS history (
+            history_id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            events JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'ALTER TABLE history ENABLE ROW LEVEL SECURITY',
+        'CREATE INDEX IF NOT EXISTS history_user_id_mode_idx ON history (user_id, mode, history_id DESC)',
+    ]),
+    # The listing of all files is read by keyset on (uploaded_at, file_id)
+    Migration(5, "all files index", [
+        'CREATE INDEX IF NOT EXISTS files_uploaded_at_file_id_idx ON files (uploaded_at DESC, file_id DESC)',
+    ]),
+]
+
+# SQLite databases start from the current schema, changes have to be added to both lists
+SQLITE_MIGRATIONS: list[Migration] = [
+    Migration(1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            name TEXT,
+            created_at TIMESTAMPTZ NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS files (
+            file_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            type TEXT,
+            uploaded_at TIMESTAMPTZ NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS links (
+            link_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            description TEXT,
+            added_at TIMESTAMPTZ NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS questions (
+            question_id TEXT PRIMARY KEY,
+            question TEXT NOT NULL,
+            answers TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS answers (
+            answer_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            answers JSONB NOT NULL,
+            comment TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS files_user_id_uploaded_at_idx ON files (user_id, uploaded_at DESC)',
+        'CREATE INDEX IF NOT EXISTS links_user_id_added_at_idx ON links (user_id, added_at DESC)',
+        'CREATE INDEX IF NOT EXISTS answers_user_id_idx ON answers (user_id)',
+        'CREATE INDEX IF NOT EXISTS sessions_user_id_idx ON sessions (user_id)',
+        'CREATE INDEX IF NOT EXISTS sessions_expires_at_idx ON sessions (expires_at)',
+    ]),
+    Migration(2, "query history", [
+        '''
+        CREATE TABLE IF NOT EXISTS history (
+            history_id INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            mode TEXT NOT NULL,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            events JSONB NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS history_user_id_mode_idx ON history (user_id, mode, history_id DESC)',
+    ]),
+    Migration(3, "all files index", [
+        'CREATE INDEX IF NOT EXISTS files_uploaded_at_file_id_idx ON files (uploaded_at DESC, file_id DESC)',
+    ]),
+]
+
+MIGRATIONS_BY_DIALECT = {DIALECT_POSTGRES: MIGRATIONS, DIALECT_SQLITE: SQLITE_MIGRATIONS}
+
+
+def migrate(migrations: Optional[list[Migration]] = None) -> list[int]:
+    """
+    Apply the migrations the database does not have yet.
+
+    A lock keeps several processes starting at the same time from applying the same
+    migration twice.
+
+    Args:
+        migrations: The migrations, in version order, the ones of the storage backend's dialect by default
+
+    Returns:
+        list[int]: Versions applied by this call
+    """
+    backend = get_storage_backend()
+    if migrations is None:
+        migrations = MIGRATIONS_BY_DIALECT[backend.dialect]
+
+    with db_conneciton() as cursor:
+        backend.lock(cursor, MIGRATION_LOCK_ID)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+
+        applied_now = []
+        for migration in migrations:
+            if migration.version in applied:
+                continue
+
+            print(f"Applying migration {migration.version}: {migration.name}")
+            for statement in migration.statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                           (migration.version, migration.name))
+            applied_now.append(migration.version)
+
+    return applied_now
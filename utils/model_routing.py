@@ -0,0 +1,146 @@
+"""
+Routing of LLM steps to a model, reasoning effort and token cap by query complexity
+"""
+
+import re
+from statistics import mean
+from typing import NamedTuple, Optional
+
+import streamlit as st
+from langchain_openai import ChatOpenAI
+
+from config.config import (MODEL_ROUTES, MODEL_ROUTING_ENABLED, OPENAI_BASE_URL, ROUTING_SCORE_SPREAD_HIGH,
+                           ROUTING_SCORE_SPREAD_LOW)
+
+COMPLEXITY_SIMPLE = "simple"
+COMPLEXITY_STANDARD = "standard"
+COMPLEXITY_COMPLEX = "complex"
+
+STEP_AUGMENTATION = "augmentation"
+STEP_GENERATION = "generation"
+STEP_REFLECTION = "reflection"
+STEP_CONVENTIONAL = "conventional"
+
+# Questions that ask for a diagnosis or a procedure rather than a value from the manual
+_REASONING_PATTERN = re.compile(
+    r"\b(why|how (do|can|should) i|step[- ]by[- ]step|steps|procedure|troubleshoot\w*|diagnos\w*|causes?|"
+    r"not (working|starting|building)|does not|doesn't|won't|fails?|failing|overheat\w*|leak\w*|noise|vibrat\w*)\b",
+    re.IGNORECASE)
+_LOOKUP_PATTERN = re.compile(
+    r"\b(torque|spec(ification)?s?|part number|dimensions?|capacity|clearance|pressure rating|"
+    r"interval|lubricant|oil type|size|weight|which part|what is the)\b",
+    re.IGNORECASE)
+_FAULT_CODE_PATTERN = re.compile(r"\b(?:(?:error|fault|alarm)\s+(?:code\s+)?\w+|[A-Z]{1,3}-\d{1,4})\b", re.IGNORECASE)
+_PART_NUMBER_PATTERN = re.compile(r"\b(?=[A-Z0-9./-]*\d)(?=[A-Z0-9./-]*[A-Z])[A-Z0-9][A-Z0-9./-]{4,}\b")
+
+
+class ModelRoute(NamedTuple):
+    """Model settings of an LLM step."""
+    model: str
+    reasoning_effort: Optional[str]
+    max_tokens: int
+
+
+def score_spread(scores: list[float]) -> Optional[float]:
+    """
+    Margin of the best reranked chunk over the next ones.
+
+    Args:
+        scores: Cross-encoder scores of the retrieved chunks
+
+    Returns:
+        Optional[float]: The spread, None if there are not enough scores
+    """
+    ordered = sorted(scores, reverse=True)
+    if len(ordered) < 2:
+        return None
+    return ordered[0] - mean(ordered[1:5])
+
+
+def classify_query(question: str, scores: Optional[list[float]] = None) -> str:
+    """
+    Classify a question by the effort needed to answer it, without calling an LLM.
+
+    A short lookup of a value, e.g. the torque spec of a bolt, is simple. Diagnoses,
+    procedures and fault codes add to the complexity, and so do retrieval results where
+    no chunk clearly stands out, since the answer has to be put together from several.
+
+    Args:
+        question: The user's question
+        scores: Cross-encoder scores of the retrieved chunks, if retrieval already ran
+
+    Returns:
+        str: COMPLEXITY_SIMPLE, COMPLEXITY_STANDARD or COMPLEXITY_COMPLEX
+    """
+    points = 0
+
+    words = len(question.split())
+    if words > 20:
+        points += 1
+    if words > 40:
+        points += 1
+
+    if _REASONING_PATTERN.search(question):
+        points += 2
+    if _FAULT_CODE_PATTERN.search(question):
+        points += 1
+    if _LOOKUP_PATTERN.search(question) or _PART_NUMBER_PATTERN.search(question):
+        points -= 1
+
+    spread = score_spread(scores) if scores else None
+    if spread is not None:
+        if spread >= ROUTING_SCORE_SPREAD_HIGH:
+            points -= 1
+        elif spread < ROUTING_SCORE_SPREAD_LOW:
+            points += 1
+
+    if points <= 0:
+        return COMPLEXITY_SIMPLE
+    if points <= 2:
+        return COMPLEXITY_STANDARD
+    return COMPLEXITY_COMPLEX
+
+
+def route(step: str, complexity: Optional[str] = None) -> ModelRoute:
+    """
+    Choose the model settings of an LLM step.
+
+    Args:
+        step: STEP_AUGMENTATION, STEP_GENERATION, STEP_REFLECTION or STEP_CONVENTIONAL
+        complexity: Complexity of the question, the complex route is used if not provided
+
+    Returns:
+        ModelRoute: The model settings
+    """
+    routes = MODEL_ROUTES[step]
+    if not MODEL_ROUTING_ENABLED or complexity not in routes:
+        complexity = COMPLEXITY_COMPLEX
+    return ModelRoute(**routes[complexity])
+
+
+def completion_kwargs(model_route: ModelRoute) -> dict:
+    """
+    Arguments of chat.completions.create for a route.
+
+    Args:
+        model_route: The model settings
+
+    Returns:
+        dict: model, max_completion_tokens and, for reasoning models, reasoning_effort
+    """
+    kwargs = {"model": model_route.model, "max_completion_tokens": model_route.max_tokens}
+    if model_route.reasoning_effort:
+        kwargs["reasoning_effort"] = model_route.reasoning_effort
+    return kwargs
+
+
+@st.cache_resource
+def get_chat_model(model_route: ModelRoute) -> ChatOpenAI:
+    """Get the LangChain chat model of a route, shared by every session"""
+    kwargs = {}
+    if model_route.reasoning_effort:
+        kwargs["reasoning_effort"] = model_route.reasoning_effort
+
+    # Retries are done by the LLM scheduler
+    return ChatOpenAI(model=model_route.model, base_url=OPENAI_BASE_URL, max_retries=0,
+                      max_completion_tokens=model_route.max_tokens, **kwargs)
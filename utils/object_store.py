@@ -0,0 +1,121 @@
+"""
+Stores of the uploaded files
+"""
+
+import os
+import pathlib
+import shutil
+from abc import ABC, abstractmethod
+
+import streamlit as st
+
+from config.config import LOCAL_OBJECT_STORE_DIR, OBJECT_STORE
+from utils.db_conneciton import get_supabase_client
+
+OBJECT_STORE_SUPABASE = "supabase"
+OBJECT_STORE_LOCAL = "local"
+
+
+class ObjectStore(ABC):
+    """Store of file contents by key, the key being the path of the file relative to the upload dir."""
+
+    @abstractmethod
+    def upload(self, file_path: str, key: str) -> None:
+        """
+        Store a file.
+
+        Args:
+            file_path: Local path of the file
+            key: Key to store it under
+        """
+
+    @abstractmethod
+    def download(self, key: str) -> bytes:
+        """
+        Get the content of a stored file.
+
+        Args:
+            key: Key of the file
+
+        Returns:
+            bytes: The content
+        """
+
+    @abstractmethod
+    def remove(self, keys: list[str]) -> None:
+        """
+        Delete stored files.
+
+        Args:
+            keys: Keys of the files
+        """
+
+
+class SupabaseObjectStore(ObjectStore):
+    """Supabase storage bucket configured in st.secrets.bucket."""
+
+    def __init__(self):
+        supabase = get_supabase_client()
+        self.bucket = supabase.storage.from_(st.secrets.bucket["BUCKET_NAME"])
+
+    def upload(self, file_path: str, key: str) -> None:
+        self.bucket.upload(
+            file=pathlib.Path(file_path),
+            path=key,
+            file_options={"cache-control": "86400",
+                          "upsert": "false"}  # 86400 is 1 day
+        )
+
+    def download(self, key: str) -> bytes:
+        return self.bucket.download(key)
+
+    def remove(self, keys: list[str]) -> None:
+        self.bucket.remove(keys)
+
+
+class LocalObjectStore(ObjectStore):
+    """Directory on the local filesystem."""
+
+    def __init__(self, root: str):
+        """
+        Initialize the store.
+
+        Args:
+            root: Directory the files are stored in, created if missing
+        """
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Key outside of the store: {key}")
+        return path
+
+    def upload(self, file_path: str, key: str) -> None:
+        path = self._path(key)
+        if os.path.abspath(file_path) == path:
+            # The file was written in the store directly
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path)
+
+    def download(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def remove(self, keys: list[str]) -> None:
+        for key in keys:
+            path = self._path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+@st.cache_resource
+def get_object_store() -> ObjectStore:
+    if OBJECT_STORE == OBJECT_STORE_LOCAL:
+        return LocalObjectStore(LOCAL_OBJECT_STORE_DIR)
+    if OBJECT_STORE == OBJECT_STORE_SUPABASE:
+        return SupabaseObjectStore()
+    raise ValueError(f"Unknown object store: {OBJECT_STORE}")
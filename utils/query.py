@@ -0,0 +1,69 @@
+"""
+Typed queries mapping rows to models
+"""
+
+from typing import Any, Callable, Iterator, Optional, Sequence, TypeVar
+
+from utils.db_conneciton import db_conneciton
+
+T = TypeVar("T")
+
+
+def fetch_one(query: str, params: Sequence[Any], row_factory: Callable[..., T]) -> Optional[T]:
+    """
+    Run a query and map its first row.
+
+    Args:
+        query: The query, with %s placeholders
+        params: Parameters of the query
+        row_factory: Called with the columns of the row
+
+    Returns:
+        Optional[T]: The mapped row, None if the query returned no row
+    """
+    with db_conneciton() as cursor:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+
+    return row_factory(*row) if row else None
+
+
+def fetch_all(query: str, params: Sequence[Any], row_factory: Callable[..., T]) -> list[T]:
+    """
+    Run a query and map all its rows.
+
+    Args:
+        query: The query, with %s placeholders
+        params: Parameters of the query
+        row_factory: Called with the columns of each row
+
+    Returns:
+        list[T]: The mapped rows
+    """
+    with db_conneciton() as cursor:
+        cursor.execute(query, params)
+        return [row_factory(*row) for row in cursor]
+
+
+def iter_rows(query: str, params: Sequence[Any], row_factory: Callable[..., T], name: str,
+              itersize: int = 2000) -> Iterator[T]:
+    """
+    Run a query on a server-side cursor and map its rows as they are fetched.
+
+    Only a batch of rows is held in memory at a time. The connection stays checked out until
+    the iterator is exhausted or closed.
+
+    Args:
+        query: The query, with %s placeholders
+        params: Parameters of the query
+        row_factory: Called with the columns of each row
+        name: Name of the server-side cursor
+        itersize: Rows fetched per batch
+
+    Returns:
+        Iterator[T]: The mapped rows
+    """
+    with db_conneciton(name=name, itersize=itersize) as cursor:
+        cursor.execute(query, params)
+        for row in cursor:
+            yield row_factory(*row)
@@ -0,0 +1,82 @@
+"""
+Rate limiting utilities
+"""
+
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Thread-safe token bucket, refilled continuously at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket, full.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Max number of tokens, defaults to one second worth of tokens
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens if they are available.
+
+        Args:
+            tokens: Number of tokens to take, capped at the capacity
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before retrying
+        """
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def release(self, tokens: float = 1.0) -> None:
+        """
+        Give back tokens that were taken but not used.
+
+        Args:
+            tokens: Number of tokens to give back
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def acquire(self, tokens: float = 1.0, timeout: Optional[float] = None) -> bool:
+        """
+        Take tokens, waiting until they are available.
+
+        Args:
+            tokens: Number of tokens to take, capped at the capacity
+            timeout: Max seconds to wait, None waits forever
+
+        Returns:
+            bool: True if the tokens were taken, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
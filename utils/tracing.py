@@ -0,0 +1,271 @@
+"""
+Per-run tracing of pipeline steps, LLM calls and retrieval
+"""
+
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional
+
+from config.config import TRACE_PATH
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_sink_lock = threading.Lock()
+_listeners: list[Callable[["Trace"], None]] = []
+
+
+@dataclass
+class Span:
+    """A timed step of a run."""
+    name: str
+    started_at: float
+    parent: Optional[str] = None
+    duration: float = 0.0
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes to the span, e.g. token counts or cache hits."""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the span to a dictionary."""
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'started_at': self.started_at,
+            'duration': round(self.duration, 4),
+            **self.attributes
+        }
+
+
+class Trace:
+    """The spans recorded during a single query run."""
+
+    def __init__(self, kind: str, run_id: Optional[str] = None, **attributes: Any):
+        """
+        Initialize the trace.
+
+        Args:
+            kind: Pipeline that is traced, e.g. "agent" or "conventional"
+            run_id: ID of the run, generated if not provided
+            attributes: Extra attributes stored with the run
+        """
+        self.kind = kind
+        self.run_id = run_id or str(uuid.uuid4())
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        """Add a finished span, spans can finish in any thread."""
+        with self._lock:
+            self.spans.append(span)
+
+    def breakdown(self) -> list[dict[str, Any]]:
+        """
+        Aggregate the spans by name.
+
+        Returns:
+            list[dict]: One row per span name with calls, time, tokens and cache hits
+        """
+        rows: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            row = rows.setdefault(span.name, {
+                'name': span.name, 'calls': 0, 'duration': 0.0,
+                'prompt_tokens': 0, 'completion_tokens': 0, 'cache_hits': 0, 'retries': 0
+            })
+            row['calls'] += 1
+            row['duration'] += span.duration
+            row['prompt_tokens'] += span.attributes.get('prompt_tokens', 0)
+            row['completion_tokens'] += span.attributes.get('completion_tokens', 0)
+            row['cache_hits'] += int(span.attributes.get('cache_hit', False))
+            row['retries'] += span.attributes.get('retries', 0)
+
+        return sorted(rows.values(), key=lambda r: r['duration'], reverse=True)
+
+    def summary(self) -> str:
+        """
+        Render the run breakdown as a markdown table.
+
+        Returns:
+            str: The markdown table
+        """
+        lines = [
+            f"**Run breakdown** ({self.duration:.2f} s total)",
+            "",
+            "| Step | Calls | Time (s) | Prompt tokens | Completion tokens | Cache hits | Retries |",
+            "|---|---|---|---|---|---|---|",
+        ]
+        for row in self.breakdown():
+            lines.append(
+                f"| {row['name']} | {row['calls']} | {row['duration']:.2f} | {row['prompt_tokens']} "
+                f"| {row['completion_tokens']} | {row['cache_hits']} | {row['retries']} |")
+
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Convert the trace to a dictionary."""
+        with self._lock:
+            spans = [s.to_dict() for s in self.spans]
+
+        return {
+            'run_id': self.run_id,
+            'kind': self.kind,
+            'started_at': self.started_at,
+            'duration': round(self.duration, 4),
+            **self.attributes,
+            'spans': spans
+        }
+
+    def write(self) -> None:
+        """Append the trace to the JSONL sink."""
+        try:
+            line = json.dumps(self.to_dict(), default=str)
+            with _sink_lock, open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            print(f"Error writing trace: {e}")
+
+
+def add_trace_listener(listener: Callable[["Trace"], None]) -> None:
+    """
+    Register a function called with every finished trace, e.g. to aggregate load test results.
+
+    Args:
+        listener: Function taking the finished trace
+    """
+    _listeners.append(listener)
+
+
+def remove_trace_listener(listener: Callable[["Trace"], None]) -> None:
+    """
+    Unregister a function added with add_trace_listener.
+
+    Args:
+        listener: The registered function
+    """
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def get_current_trace() -> Optional[Trace]:
+    """Get the trace of the run executing in the current context."""
+    return _current_trace.get()
+
+
+def get_current_span() -> Optional[Span]:
+    """Get the innermost span open in the current context."""
+    return _current_span.get()
+
+
+@contextmanager
+def trace_run(kind: str, run_id: Optional[str] = None, **attributes: Any) -> Iterator[Trace]:
+    """
+    Trace a query run, every span opened inside is recorded in the yielded trace.
+
+    Args:
+        kind: Pipeline that is traced, e.g. "agent" or "conventional"
+        run_id: ID of the run, generated if not provided
+        attributes: Extra attributes stored with the run
+
+    Yields:
+        Trace: The trace of the run, written to the sink when the run ends
+    """
+    trace = Trace(kind, run_id, **attributes)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.attributes['error'] = repr(e)
+        raise
+    finally:
+        trace.duration = time.time() - trace.started_at
+        _current_trace.reset(token)
+        trace.write()
+
+        for listener in list(_listeners):
+            try:
+                listener(trace)
+            except Exception as e:
+                print(f"Error in trace listener: {e}")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a step of the current run. Outside of a run the span is timed but not recorded.
+
+    Args:
+        name: Name of the step, e.g. "llm.generation"
+        attributes: Attributes of the span
+
+    Yields:
+        Span: The span, use span.set() to add attributes such as token counts
+    """
+    parent = _current_span.get()
+    current = Span(name=name, started_at=time.time(),
+                   parent=parent.name if parent else None, attributes=attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=repr(e))
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(current)
+
+
+def traced_node(name: str, node: Callable) -> Callable:
+    """
+    Wrap a graph node so that each of its executions is recorded as a span.
+
+    Args:
+        name: Name of the node
+        node: The node function
+
+    Returns:
+        Callable: The wrapped node
+    """
+    @wraps(node)
+    def wrapper(state, *args, **kwargs):
+        with span(f"node.{name}"):
+            return node(state, *args, **kwargs)
+
+    return wrapper
+
+
+def record_usage(current: Span, response: Any) -> None:
+    """
+    Add the token usage of an LLM response to a span.
+
+    Args:
+        current: The span of the LLM call
+        response: A LangChain AIMessage or an OpenAI chat completion
+    """
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    if usage_metadata:
+        current.set(prompt_tokens=usage_metadata.get('input_tokens', 0),
+                    completion_tokens=usage_metadata.get('output_tokens', 0))
+        return
+
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        current.set(prompt_tokens=usage.prompt_tokens or 0,
+                    completion_tokens=usage.completion_tokens or 0)
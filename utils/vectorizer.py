@@ -1,13 +1,11 @@
 import traceback
 import streamlit as st
 
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-
 from langchain_text_splitters import RecursiveCharacterTextSplitter, SentenceTransformersTokenTextSplitter
 
 from modules.file.file_model import FileModel
 from modules.link.link_model import LinkModel
-from utils.ai_utils import check_api_key, get_retriever_id, get_chroma_client
+from utils.ai_utils import check_api_key, get_retriever_id, get_chroma_client, get_embedding_function
 from utils.documents import get_documents_from_files, get_documents_from_links
 
 
@@ -80,7 +78,7 @@ def vectorize(files: list[FileModel] | None = None,
             for text in character_split_texts:
                 token_split_texts += token_splitter.split_text(text)
 
-            embedding_function = SentenceTransformerEmbeddingFunction()
+            embedding_function = get_embedding_function()
 
             chroma_collection = chroma_client.create_collection(collection_name, embedding_function=embedding_function)
 